@@ -0,0 +1,441 @@
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import wait
+
+import numpy as np
+
+from app.src.audio import (
+    AdaptiveDetector,
+    AnalysisOffload,
+    AudioBus,
+    AudioEncoder,
+    AudioRingBuffer,
+    Clip,
+    Decimator,
+    GoertzelDetector,
+    PeakDetector,
+    SyntheticSource,
+)
+from app.src.auto_unlock import AutoUnlockAppWAuth
+from app.src.switch_bot.switch_bot import SwitchBot
+from app.standin import (
+    AutoUnlockAPIHandler,
+    SwitchBotHandler,
+    self_signed_cert,
+    start_server,
+)
+from app.utils import EntranceInfo, logger, settings
+
+
+class BusyDetector(PeakDetector):
+    def __init__(self, chunk, channels, cost_ms):
+        """Peak detector with `cost_ms` of extra pure-Python work per chunk
+
+        Stands in for a heavier analysis that holds the GIL.
+        """
+        super().__init__(chunk, channels, settings.THRESHOLD)
+        self.cost = cost_ms / 1000
+
+    def __call__(self, samples):
+        end = time.thread_time() + self.cost  # CPU time, not wall time
+        while time.thread_time() < end:
+            pass
+        return super().__call__(samples)
+
+
+class Capture:
+    def __init__(self, rate, chunk, channels, seconds):
+        """Real-time producer standing in for the PortAudio callback thread"""
+        self.period = chunk / rate
+        self.n_chunks = int(seconds / self.period)
+        self.ring_buffer = AudioRingBuffer(chunk, channels, settings.RING_BUFFER_CHUNKS)
+        self.data = np.zeros(chunk * channels, dtype=np.int16).tobytes()
+        self.late = []
+        self.backlog = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        start = time.perf_counter()
+        for i in range(self.n_chunks):
+            deadline = start + (i + 1) * self.period
+            time.sleep(max(deadline - time.perf_counter(), 0))
+            self.late.append(time.perf_counter() - deadline)
+            self.ring_buffer.write(self.data)
+
+    def chunks(self):
+        self.thread.start()
+        out = np.zeros(self.ring_buffer.chunk * self.ring_buffer.channels, np.int16)
+        while self.thread.is_alive() or len(self.ring_buffer):
+            self.backlog = max(self.backlog, len(self.ring_buffer))
+            try:
+                yield self.ring_buffer.read_into(out, timeout=self.period * 2)
+            except TimeoutError:
+                continue
+
+
+def run_inline(capture, detector):
+    for samples in capture.chunks():
+        detector(samples)
+    return 0
+
+
+def run_offload(capture, offload, bus):
+    # published on the bus as the capture stage does; the workers read it there
+    futures, batch = [], []
+    for samples in capture.chunks():
+        np.copyto(bus.next_slot(), samples)
+        bus.commit()
+        batch.append(bus.written - 1)
+        if len(batch) == offload.batch_chunks:
+            futures.append(offload.submit(batch))
+            batch = []
+    wait([f for f in futures if f is not None])
+    missed = sum(int((~f.result()[3]).sum()) for f in futures if f is not None)
+    return offload.dropped * offload.batch_chunks + missed
+
+
+def bench_offload(args):
+    print(
+        f"{args.seconds:.0f} s of {settings.CHUNK}-frame chunks at {settings.RATE} Hz "
+        f"({settings.CHUNK / settings.RATE * 1000:.0f} ms per chunk), "
+        f"{args.workers} worker(s), {args.batch} chunk(s) per batch"
+    )
+    print(
+        f"{'mode':<9}{'cost ms':>8}{'chunks':>8}{'overruns':>10}"
+        f"{'late p99 ms':>13}{'backlog s':>11}{'not analysed':>14}"
+    )
+    for cost in args.costs:
+        for mode in ("inline", "offload"):
+            detector = BusyDetector(settings.CHUNK, settings.CHANNELS, cost)
+            capture = Capture(
+                settings.RATE, settings.CHUNK, settings.CHANNELS, args.seconds
+            )
+            if mode == "inline":
+                skipped = run_inline(capture, detector)
+            else:
+                bus = AudioBus(
+                    settings.CHUNK, settings.CHANNELS, settings.AUDIO_BUS_CHUNKS
+                )
+                offload = AnalysisOffload(
+                    bus, detector, args.batch, args.slots, args.workers
+                )
+                offload.start()
+                try:
+                    skipped = run_offload(capture, offload, bus)
+                finally:
+                    offload.close()
+                    bus.close()
+            late = np.percentile(np.asarray(capture.late) * 1000, 99)
+            print(
+                f"{mode:<9}{cost:>8.0f}{capture.n_chunks:>8}"
+                f"{capture.ring_buffer.overruns:>10}{late:>13.2f}"
+                f"{capture.backlog * capture.period:>11.2f}{skipped:>14}"
+            )
+
+
+def speech_like(rate, chunk, channels, seconds):
+    """Chunks of a voiced, amplitude-modulated signal with some noise"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(rate * seconds)) / rate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2
+    voice = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 20))
+    signal = 6000 * envelope * voice + rng.normal(0, 300, t.size)
+    frames = np.repeat(signal[:, None], channels, axis=1).astype(np.int16)
+    return [
+        frames[i : i + chunk].tobytes() for i in range(0, len(t) - chunk + 1, chunk)
+    ]
+
+
+def bench_encode(args):
+    frames = speech_like(settings.RATE, settings.CHUNK, args.channels, args.seconds)
+    seconds = len(frames) * settings.CHUNK / settings.RATE
+    print(
+        f"{seconds:.1f} s clip, {args.channels} channel(s) at {settings.RATE} Hz, "
+        f"upload time at {args.mbps:g} Mbit/s"
+    )
+    print(
+        f"{'rate':>6}{'mono':>6}{'codec':>7}{'bytes':>10}{'saved':>8}"
+        f"{'encode ms':>11}{'upload ms':>11}{'total ms':>10}"
+    )
+    raw = sum(len(frame) for frame in frames)
+    # the encoder never upsamples: rates above the capture rate are the capture rate
+    rates = sorted({min(rate or settings.RATE, settings.RATE) for rate in args.rates})
+    for rate in reversed(rates):
+        for mono in (False, True):
+            for codec in ("pcm", "ulaw"):
+                if mono and args.channels == 1:
+                    continue
+                times = []
+                for _ in range(args.repeat):
+                    encoder = AudioEncoder(
+                        settings.RATE, args.channels, rate, mono, codec
+                    )
+                    start = time.process_time()
+                    size = sum(len(encoder(frame)) for frame in frames)
+                    times.append(time.process_time() - start)
+                encode = min(times) * 1000
+                upload = size * 8 / (args.mbps * 1e6) * 1000
+                print(
+                    f"{encoder.rate:>6}{'yes' if mono else 'no':>6}{codec:>7}"
+                    f"{size:>10}{1 - size / raw:>8.0%}{encode:>11.2f}"
+                    f"{upload:>11.1f}{encode + upload:>10.1f}"
+                )
+
+
+def feed(bus, frames, period, ended):
+    """Publish `frames` on `bus` in real time, as the capture stage does"""
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        time.sleep(max(start + (i + 1) * period - time.perf_counter(), 0))
+        np.copyto(bus.next_slot(), np.frombuffer(frame, dtype=np.int16))
+        bus.commit()
+    ended.append(time.perf_counter())
+
+
+def bench_upload(args):
+    import requests
+
+    logger.setLevel(logging.WARNING)  # one "End recording." line per upload
+    server = start_server(
+        AutoUnlockAPIHandler, read_bps=args.mbps * 1e6 / 8, delay=args.delay
+    )
+    frames = speech_like(settings.RATE, settings.CHUNK, settings.CHANNELS, args.seconds)
+    period = settings.CHUNK / settings.RATE
+    source = SyntheticSource(
+        settings.RATE, settings.CHUNK, settings.CHANNELS, args.seconds
+    )
+    app = AutoUnlockAppWAuth(source, EntranceInfo("", api_url=server.url))
+    app.session = requests.Session()
+    app.endpoint_silence_sec = 0  # the same fixed-length clip in both modes
+    app.save_dir = ""
+    print(
+        f"{len(frames) * period:.1f} s clip recorded in real time, encoded as "
+        f"{app.create_encoder().description}, uplink at {args.mbps:g} Mbit/s, "
+        f"API answering in {args.delay * 1000:.0f} ms"
+    )
+    print(f"{'mode':<11}{'bytes':>9}{'after recording p50 ms':>24}{'p95 ms':>9}")
+    for mode in ("buffered", "streaming"):
+        app.upload_mode = mode
+        waits = []
+        for _ in range(args.repeat):
+            bus = AudioBus(settings.CHUNK, settings.CHANNELS, len(frames) + 2)
+            clip = Clip(bus, 0, len(frames))
+            ended = []
+            feeder = threading.Thread(target=feed, args=(bus, frames, period, ended))
+            feeder.start()
+            app.post_api(True, clip)
+            feeder.join()
+            waits.append((time.perf_counter() - ended[0]) * 1000)
+            bus.close()
+        print(
+            f"{mode:<11}{server.uploads[-1]['bytes']:>9}"
+            f"{np.percentile(waits, 50):>24.1f}{np.percentile(waits, 95):>9.1f}"
+        )
+
+
+def percentiles_ms(fn, n):
+    """p50 and p95 of `n` calls of `fn`, in ms"""
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def bench_switch_bot(args):
+    import requests
+
+    logger.setLevel(logging.WARNING)  # one "Response:" line per command
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = args.cert, args.key
+        if cert is None:
+            cert, key = self_signed_cert(directory)
+        server = start_server(SwitchBotHandler, tls=(cert, key))
+        bot = SwitchBot(api_url=server.url)
+        bot.session.trust_env = False  # REQUESTS_CA_BUNDLE would override `verify`
+        bot.session.verify = cert
+        bot.switch_bot_token = bot.switch_bot_token or "token"
+        bot.switch_bot_secret = bot.switch_bot_secret or "secret"
+        url = f"{server.url}/{bot.VERSION}/devices/bench/commands"
+
+        def per_call():
+            # as before the pooled session: a new connection and TLS handshake
+            requests.post(url, data="{}", verify=cert).json()
+
+        def prepared():
+            bot.prepare("bench", "turnOn")
+            start = time.perf_counter()
+            bot.control_device("bench", "turnOn")
+            return time.perf_counter() - start
+
+        rows = [("new connection per call", percentiles_ms(per_call, args.calls))]
+        bot.warm_up()
+        rows.append(
+            (
+                "pooled, warmed session",
+                percentiles_ms(
+                    lambda: bot.control_device("bench", "turnOn"), args.calls
+                ),
+            )
+        )
+        sends = [prepared() * 1000 for _ in range(args.calls)]
+        rows.append(("pooled, prepared command", tuple(np.percentile(sends, [50, 95]))))
+        bot.close()
+        server.shutdown()
+    print(f"{args.calls} control_device calls against {server.url} (self-signed TLS)")
+    print(f"{'':<26}{'p50 ms':>8}{'p95 ms':>8}")
+    for name, (p50, p95) in rows:
+        print(f"{name:<26}{p50:>8.2f}{p95:>8.2f}")
+
+
+def create_detector(kind, chunk, channels, rate):
+    if kind == "goertzel":
+        return GoertzelDetector(
+            chunk,
+            channels,
+            rate,
+            settings.CHIME_FREQUENCIES or [800],
+            settings.CHIME_POWER_RATIO,
+            settings.CHIME_MIN_LEVEL,
+        )
+    if kind == "adaptive":
+        return AdaptiveDetector(
+            chunk,
+            channels,
+            rate,
+            settings.NOISE_MARGIN_DB,
+            settings.NOISE_FLOOR_TIME_SEC,
+            settings.NOISE_MIN_LEVEL,
+        )
+    return PeakDetector(chunk, channels, settings.THRESHOLD)
+
+
+def chime_chunks(rate, chunk, channels, seconds):
+    """Chunks of background noise with a two-tone chime every 5 seconds"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(rate * seconds)) / rate
+    signal = rng.normal(0, 100, t.size)
+    ringing = (t % 5 >= 2) & (t % 5 < 3)
+    for frequency in settings.CHIME_FREQUENCIES or [800]:
+        signal[ringing] += 12000 * np.sin(2 * np.pi * frequency * t[ringing])
+    frames = np.repeat(signal[:, None], channels, axis=1).astype(np.int16)
+    return [frames[i : i + chunk].ravel() for i in range(0, len(t) - chunk + 1, chunk)]
+
+
+def bench_decimate(args):
+    chunks = chime_chunks(settings.RATE, settings.CHUNK, args.channels, args.seconds)
+    seconds = len(chunks) * settings.CHUNK / settings.RATE
+    print(
+        f"{seconds:.0f} s of {settings.CHUNK}-frame chunks, "
+        f"{args.channels} channel(s) at {settings.RATE} Hz"
+    )
+    print(
+        f"{'detector':<10}{'factor':>7}{'rate Hz':>9}{'ms per s':>10}"
+        f"{'CPU %':>7}{'active':>8}"
+    )
+    for kind in args.detectors:
+        for factor in args.factors:
+            if settings.CHUNK % factor:
+                continue
+            front_end = None
+            chunk, rate = settings.CHUNK, settings.RATE
+            if factor > 1:
+                front_end = Decimator(settings.CHUNK, args.channels, factor)
+                chunk, rate = front_end.chunk, rate / factor
+            detector = create_detector(kind, chunk, args.channels, rate)
+            active = 0
+            start = time.process_time()
+            for samples in chunks:
+                if front_end is not None:
+                    samples = front_end(samples)
+                active += bool(detector(samples))
+            cpu = (time.process_time() - start) / seconds
+            print(
+                f"{kind:<10}{factor:>7}{rate:>9.0f}{cpu * 1000:>10.2f}"
+                f"{cpu * 100:>7.2f}{active:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the audio path.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    offload = commands.add_parser(
+        "offload", help="capture timing with the detector inline or in a process pool"
+    )
+    offload.add_argument(
+        "--costs",
+        type=float,
+        nargs="+",
+        default=[0, 25, 50, 100, 200],
+        help="extra analysis time per chunk in ms",
+    )
+    offload.add_argument("--seconds", type=float, default=10.0)
+    offload.add_argument("--workers", type=int, default=2)
+    offload.add_argument("--batch", type=int, default=settings.ANALYSIS_BATCH_CHUNKS)
+    offload.add_argument("--slots", type=int, default=settings.ANALYSIS_SLOTS)
+    offload.set_defaults(run=bench_offload)
+
+    encode = commands.add_parser(
+        "encode", help="encoding CPU time against upload size and time"
+    )
+    encode.add_argument(
+        "--rates",
+        type=int,
+        nargs="+",
+        default=[0, 16000, 8000],
+        help="upload sample rates, 0 for the capture rate",
+    )
+    encode.add_argument("--channels", type=int, default=settings.CHANNELS)
+    encode.add_argument("--seconds", type=float, default=settings.DURATION + 1)
+    encode.add_argument("--mbps", type=float, default=2.0, help="uplink throughput")
+    encode.add_argument("--repeat", type=int, default=5)
+    encode.set_defaults(run=bench_encode)
+
+    switch_bot = commands.add_parser(
+        "switchbot",
+        help="control_device latency, new connection per call vs. pooled session, "
+        "against a local TLS stand-in",
+    )
+    switch_bot.add_argument("--calls", type=int, default=50)
+    switch_bot.add_argument("--cert", help="certificate of the stand-in (default: new)")
+    switch_bot.add_argument("--key", help="private key of --cert")
+    switch_bot.set_defaults(run=bench_switch_bot)
+
+    upload = commands.add_parser(
+        "upload",
+        help="time from the end of the recording to the API response, "
+        "buffered vs. streaming upload, against a local stand-in",
+    )
+    upload.add_argument("--seconds", type=float, default=settings.DURATION + 1)
+    upload.add_argument("--mbps", type=float, default=2.0, help="uplink throughput")
+    upload.add_argument(
+        "--delay", type=float, default=0.1, help="API processing time in seconds"
+    )
+    upload.add_argument("--repeat", type=int, default=3)
+    upload.set_defaults(run=bench_upload)
+
+    decimate = commands.add_parser(
+        "decimate", help="detection CPU time with and without the decimating front-end"
+    )
+    decimate.add_argument(
+        "--detectors",
+        nargs="+",
+        default=["peak", "goertzel", "adaptive"],
+        choices=["peak", "goertzel", "adaptive"],
+    )
+    decimate.add_argument("--factors", type=int, nargs="+", default=[1, 2, 4, 8])
+    decimate.add_argument("--channels", type=int, default=settings.CHANNELS)
+    decimate.add_argument("--seconds", type=float, default=60.0)
+    decimate.set_defaults(run=bench_decimate)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
-from app.src import auto_unlock_app
+from app.utils import profiler
+
+with profiler.step("import app.src"):
+    from app.src import auto_unlock_app
 from app.utils import settings, logger
 
 
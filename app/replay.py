@@ -0,0 +1,98 @@
+import argparse
+import time
+from pathlib import Path
+
+from app.src.audio import AdaptiveDetector, FileSource, SyntheticSource
+from app.src.auto_unlock import AutoUnlockApp
+from app.utils import settings
+
+AUDIO_SUFFIXES = {".wav", ".raw", ".pcm"}
+
+
+def replay(source):
+    """Run the detection state machine over a finite source as fast as possible
+
+    Args:
+        source (AudioSource): Finite audio input.
+
+    Returns:
+        dict: Trigger times and latencies in seconds, chunk count and elapsed time.
+    """
+    app = AutoUnlockApp(source)
+    if isinstance(app.detector, AdaptiveDetector):
+        # start cold and leave the live noise floor alone
+        app.detector.state_file = None
+        app.detector.floor_db = None
+    chunk_sec = source.chunk / source.rate
+    triggers = []
+    chunks = 0
+
+    start = time.perf_counter()
+    while source.is_active():
+        streak = app.consecutive_frames
+        if app.detect():
+            # the trigger fires at the end of the chunk; the active run began `streak` chunks earlier
+            triggers.append(((chunks + 1) * chunk_sec, (streak + 1) * chunk_sec))
+        chunks += 1
+    elapsed = time.perf_counter() - start
+
+    return {"triggers": triggers, "chunks": chunks, "elapsed": elapsed}
+
+
+def report(name, duration, result):
+    elapsed = max(result["elapsed"], 1e-9)
+    print(
+        f"{name}: {duration:.1f} s, {result['chunks']} chunks, "
+        f"{result['chunks'] / elapsed:.0f} chunks/s ({duration / elapsed:.0f}x real time)"
+    )
+    for at, latency in result["triggers"]:
+        print(f"  trigger at {at:.3f} s (detection latency {latency:.3f} s)")
+    if not result["triggers"]:
+        print("  no trigger")
+
+
+def iter_files(paths):
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.suffix in AUDIO_SUFFIXES)
+        else:
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay recordings through the detection state machine."
+    )
+    parser.add_argument("paths", nargs="*", help="WAV/raw files or directories")
+    parser.add_argument(
+        "--rate", type=int, default=settings.RATE, help="rate of raw files"
+    )
+    parser.add_argument(
+        "--channels", type=int, default=settings.CHANNELS, help="channels of raw files"
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=float,
+        metavar="SEC",
+        help="also replay a generated signal of SEC seconds with a chime every 20 s",
+    )
+    args = parser.parse_args()
+
+    for path in iter_files(args.paths):
+        source = FileSource(
+            path, settings.CHUNK, rate=args.rate, channels=args.channels
+        )
+        report(str(path), source.duration, replay(source))
+
+    if args.synthetic:
+        frequency = (settings.CHIME_FREQUENCIES or [700.0])[0]
+        chimes = [(t, 1.5, frequency, 0.999) for t in range(5, int(args.synthetic), 20)]
+        source = SyntheticSource(
+            settings.RATE, settings.CHUNK, settings.CHANNELS, args.synthetic, chimes
+        )
+        print(f"synthetic chimes at {[t for t, *_ in chimes]} s, {frequency:.0f} Hz")
+        report("synthetic", args.synthetic, replay(source))
+
+
+if __name__ == "__main__":
+    main()
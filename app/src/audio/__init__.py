@@ -0,0 +1,21 @@
+from app.src.audio.bus import AudioBus, BusCursor
+from app.src.audio.clip import Clip
+from app.src.audio.decimator import Decimator
+from app.src.audio.detector import (
+    AdaptiveDetector,
+    Detector,
+    GoertzelDetector,
+    PeakDetector,
+)
+from app.src.audio.encoder import AudioEncoder, PolyphaseResampler
+from app.src.audio.endpoint import Endpointer
+from app.src.audio.offload import AnalysisOffload
+from app.src.audio.ring_buffer import AudioRingBuffer
+from app.src.audio.source import (
+    AudioSource,
+    AudioStallError,
+    FileSource,
+    PyAudioSource,
+    SyntheticSource,
+)
+from app.src.audio.wav import encode_wav, iter_multipart_wav, wav_header
@@ -0,0 +1,221 @@
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from app.utils import logger
+
+_HEADER_BYTES = 64  # write counter, padded to a cache line
+
+
+def map_bus(buf, chunk, channels, capacity):
+    """Write counter and chunk slots of a bus laid out in a shared memory buffer
+
+    Args:
+        buf (memoryview): Buffer of the bus's shared memory block.
+        chunk (int): Number of frames per chunk.
+        channels (int): Number of interleaved channels per frame.
+        capacity (int): Number of chunks the ring holds.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: int64 counter of the chunks written, \
+            and the int16 `(capacity, chunk * channels)` slots.
+    """
+    written = np.ndarray((1,), dtype=np.int64, buffer=buf)
+    frames = np.ndarray(
+        (capacity, chunk * channels), dtype=np.int16, buffer=buf, offset=_HEADER_BYTES
+    )
+    return written, frames
+
+
+class AudioBus:
+    def __init__(self, chunk, channels, capacity):
+        """Single-producer / multi-consumer ring of audio chunks in shared memory
+
+        The producer writes each chunk once, straight into the next slot; every
+        consumer (detector, recorder, archiver, metrics tap, ...) reads through
+        its own `BusCursor` and gets a read-only view of the slot, not a copy.
+        The bus never blocks the producer: a consumer that falls too far
+        behind skips to the oldest chunk still safe to read (see `oldest`)
+        and counts the chunks it missed. Holding back a faster-than-real-time
+        producer is up to the producer (see `lags`). Analysis worker processes
+        map the same block by `name` (see `map_bus`) and read the slots in
+        place.
+
+        Args:
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+            capacity (int): Number of chunks the ring holds.
+        """
+        self.chunk = chunk
+        self.channels = channels
+        self.capacity = max(int(capacity), 3)
+        size = _HEADER_BYTES + self.capacity * chunk * channels * 2
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.shm.name
+        self._written, self.frames = map_bus(
+            self.shm.buf, chunk, channels, self.capacity
+        )
+        self._written[0] = 0
+        self.cursors = []
+        self.missed = 0  # chunks skipped by lagging consumers
+        self._cond = threading.Condition()
+
+    @property
+    def written(self):
+        """Number of chunks written so far (the position of the next one)"""
+        return int(self._written[0])
+
+    def next_slot(self):
+        """Slot the next chunk is written into, to be filled in place
+
+        The chunk becomes visible to the consumers on `commit`.
+
+        Returns:
+            numpy.ndarray: int16 array of `chunk * channels` samples.
+        """
+        return self.frames[self.written % self.capacity]
+
+    def commit(self):
+        """Publish the chunk written into `next_slot`"""
+        with self._cond:
+            self._written[0] += 1
+            self._cond.notify_all()
+
+    def oldest(self):
+        """Position of the oldest chunk a consumer can still read safely"""
+        # the slot of position `written - capacity` is the one being refilled and
+        # the next one is refilled after the next commit: keep one chunk of margin
+        return max(self.written - self.capacity + 2, 0)
+
+    def cursor(self, name, position=None):
+        """Register a consumer
+
+        Args:
+            name (str): Consumer name, used in lag reports.
+            position (int, optional): First chunk to read. (default: the next one written)
+
+        Returns:
+            BusCursor: The consumer's cursor.
+        """
+        if position is None:
+            position = self.written
+        cursor = BusCursor(self, name, max(position, self.oldest()))
+        self.cursors.append(cursor)
+        return cursor
+
+    def lags(self):
+        """Chunks each registered consumer still has to read
+
+        Returns:
+            dict[str, int]: Lag by consumer name (the largest one for duplicate names).
+        """
+        lags = {}
+        for cursor in list(self.cursors):
+            lags[cursor.name] = max(lags.get(cursor.name, 0), cursor.lag)
+        return lags
+
+    def report(self):
+        """Log consumers more than half the ring behind, and chunks they missed"""
+        for cursor in list(self.cursors):
+            if cursor.lag > self.capacity // 2:
+                logger.warning(
+                    f"Audio bus consumer {cursor.name} is {cursor.lag} chunks behind."
+                )
+            if cursor.missed != cursor.reported_missed:
+                logger.warning(
+                    f"Audio bus consumer {cursor.name} missed "
+                    f"{cursor.missed - cursor.reported_missed} chunks."
+                )
+                cursor.reported_missed = cursor.missed
+
+    def wake(self):
+        """Wake up consumers waiting in `BusCursor.read` (e.g. to close them)"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def close(self):
+        """Detach from the shared memory and free it"""
+        self.cursors.clear()
+        self.wake()
+        self._written = None
+        self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a view is still in use; the mapping goes with the process
+        self.shm.unlink()
+
+
+class BusCursor:
+    def __init__(self, bus, name, position):
+        """One consumer's read position on an `AudioBus`
+
+        Args:
+            bus (AudioBus): Bus to read.
+            name (str): Consumer name.
+            position (int): Position of the next chunk to read.
+        """
+        self.bus = bus
+        self.name = name
+        self.position = position
+        self.missed = 0
+        self.reported_missed = 0
+        self.closed = False
+
+    @property
+    def lag(self):
+        """Chunks written but not read yet"""
+        return self.bus.written - self.position
+
+    def read_nowait(self):
+        """Read the next chunk if one is available
+
+        The view stays valid while its position is not before `oldest()`, at
+        least until the next chunk is committed; copy it if it has to outlive
+        that. A cursor that fell behind resumes at `oldest()`.
+
+        Returns:
+            numpy.ndarray | None: Read-only view of the chunk, or None.
+        """
+        if self.position >= self.bus.written:
+            return None
+        oldest = self.bus.oldest()
+        if self.position < oldest:
+            self.missed += oldest - self.position
+            self.bus.missed += oldest - self.position
+            self.position = oldest
+        view = self.bus.frames[self.position % self.bus.capacity]
+        view.flags.writeable = False
+        self.position += 1
+        return view
+
+    def read(self, timeout=None):
+        """Wait for the next chunk and read it
+
+        Args:
+            timeout (float, optional): Seconds to wait. (default: until the cursor is closed)
+
+        Returns:
+            numpy.ndarray | None: Read-only view of the chunk, or None on timeout \
+                or once the cursor is closed and has read everything written.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while (view := self.read_nowait()) is None and not self.closed:
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    return None
+            with self.bus._cond:
+                if self.position >= self.bus.written and not self.closed:
+                    self.bus._cond.wait(wait)
+        return view
+
+    def close(self):
+        """Unregister the consumer and wake it up if it is waiting"""
+        self.closed = True
+        if self in self.bus.cursors:
+            self.bus.cursors.remove(self)
+        self.bus.wake()
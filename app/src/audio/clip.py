@@ -0,0 +1,72 @@
+import time
+
+from app.utils import logger
+
+
+class Clip:
+    def __init__(self, bus, start, end, channel=None, endpointer=None, hold=0):
+        """Passphrase clip read from the audio bus by the upload thread
+
+        The clip has its own cursor on the bus, so recording never holds back
+        the detection stage: the reader iterates over the chunks as soon as
+        they are captured, until the clip is complete.
+
+        Args:
+            bus (AudioBus): Bus of the source being recorded.
+            start (int): Position of the first chunk (before the trigger for a pre-roll).
+            end (int): Position after the last chunk.
+            channel (int, optional): Record this channel only. (default: all channels)
+            endpointer (Endpointer, optional): Trim silence and end the clip after \
+                the speech. (default: record until `end`)
+            hold (int, optional): Chunks before the trigger, see `Endpointer.trim`.
+        """
+        self.bus = bus
+        self.cursor = bus.cursor("recorder", start)
+        self.end = end
+        self.n_chunks = end - self.cursor.position
+        self.channel = channel
+        self.endpointer = endpointer
+        self.hold = hold
+        self.length = 0  # chunks passed on so far
+        self.started_at = time.monotonic()
+        self.completed_at = None
+
+    def poll(self):
+        """Check whether the last chunk has been captured (called after each chunk)
+
+        Returns:
+            bool: True if the clip is complete.
+        """
+        if self.completed_at is None and self.bus.written >= self.end:
+            self.completed_at = time.monotonic()
+        return self.completed_at is not None
+
+    def close(self):
+        """End the clip early, at the last chunk captured so far"""
+        self.end = min(self.end, self.bus.written)
+        self.cursor.close()
+
+    def __iter__(self):
+        """Yield the chunks as bytes, waiting for the ones not captured yet"""
+        frames = self._read()
+        if self.endpointer is not None:
+            frames = self.endpointer.trim(frames, self.hold)
+        for frame in frames:
+            self.length += 1
+            yield frame
+        # at the endpoint, stop at the last chunk read
+        self.end = min(self.end, self.cursor.position)
+        self.close()
+        if self.cursor.missed:
+            logger.warning(f"Recording missed {self.cursor.missed} chunks.")
+
+    def _read(self):
+        cursor = self.cursor
+        while cursor.position < self.end:
+            view = cursor.read()
+            if view is None:
+                break
+            if self.channel is None:
+                yield view.tobytes()
+            else:
+                yield view.reshape(self.bus.chunk, -1)[:, self.channel].tobytes()
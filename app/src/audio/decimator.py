@@ -0,0 +1,77 @@
+import numpy as np
+
+from app.src.audio.encoder import lowpass_filter
+
+
+class Decimator:
+    def __init__(self, chunk, channels, factor, width=6, cutoff=0.6):
+        """Streaming anti-alias filter and decimator in front of the detector
+
+        Only the output samples are computed: each channel's windows of
+        `width * factor` frames, `factor` frames apart, times the filter taps
+        in one matrix-vector product, `width` multiply-adds per input sample.
+        The last `(width - 1) * factor` frames are kept for the next chunk.
+
+        Args:
+            chunk (int): Number of frames per input chunk, a multiple of `factor`.
+            channels (int): Number of interleaved channels per frame.
+            factor (int): Decimation factor.
+            width (int, optional): Filter length in output samples. (default: `6`)
+            cutoff (float, optional): Cutoff relative to the output Nyquist frequency; \
+                lower trades the top of the band for less aliasing. (default: `0.6`)
+        """
+        if chunk % factor:
+            raise ValueError(f"Chunk of {chunk} frames is not a multiple of {factor}.")
+        self.chunk = chunk // factor  # frames per output chunk
+        self.channels = channels
+        self.factor = factor
+        self.width = width
+        taps = factor * width
+        self._taps = lowpass_filter(1, taps, factor, cutoff=cutoff)[::-1].astype(
+            np.float32
+        )
+        self._history = (width - 1) * factor
+        # channel-major, so each channel is filtered on its own contiguous row
+        self._buffer = np.zeros((channels, self._history + chunk), dtype=np.float32)
+        self._bind_views()
+        self._out = np.zeros((channels, self.chunk), dtype=np.float32)
+        self.samples = np.zeros(self.chunk * channels, dtype=np.int16)
+
+    def _bind_views(self):
+        """Create the windows onto the buffer (pickling would turn them into copies)"""
+        self._windows = np.lib.stride_tricks.sliding_window_view(
+            self._buffer, self.factor * self.width, axis=1
+        )[:, :: self.factor]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_windows"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind_views()
+
+    def __call__(self, samples):
+        """Filter and decimate one chunk
+
+        Args:
+            samples (numpy.ndarray): Interleaved int16 samples of one input chunk.
+
+        Returns:
+            numpy.ndarray: Interleaved int16 samples of the output chunk (reused buffer).
+        """
+        history = self._history
+        np.copyto(
+            self._buffer[:, history:],
+            samples.reshape(-1, self.channels).T,
+            casting="unsafe",
+        )
+        np.matmul(self._windows, self._taps, out=self._out)
+        if history:
+            self._buffer[:, :history] = self._buffer[:, -history:]
+        np.clip(self._out, -32768, 32767, out=self._out)
+        np.copyto(
+            self.samples.reshape(-1, self.channels), self._out.T, casting="unsafe"
+        )
+        return self.samples
@@ -0,0 +1,313 @@
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+INT16_FULL_SCALE = 32768
+
+
+def to_int16_threshold(threshold):
+    """Convert a normalized amplitude threshold to int16 sample units
+
+    `sample / 32768 > threshold` holds exactly when `sample > floor(threshold * 32768)`,
+    so the comparison can run on the raw int16 samples.
+
+    Args:
+        threshold (float): Threshold in [0, 1].
+
+    Returns:
+        int: Threshold in int16 sample units.
+    """
+    return math.floor(threshold * INT16_FULL_SCALE)
+
+
+class Detector:
+    stateless = True  # the result of a chunk does not depend on the previous ones
+    _views = ("_float",)  # set by `_bind_views`
+
+    def __init__(self, chunk, channels):
+        """Base class of the per-chunk trigger strategies
+
+        Peak and RMS are computed once per chunk into preallocated buffers,
+        so the steady-state loop does not allocate sample arrays. Each chunk is
+        analysed as a `(chunk, channels)` view, one value per channel, and
+        `active` tells which channels triggered.
+
+        Args:
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+        """
+        self.chunk = chunk
+        self.channels = channels
+        self.size = chunk * channels
+        self.peak = 0
+        self.rms = 0.0
+        self.peaks = np.zeros(channels, dtype=np.int16)
+        self.levels = np.zeros(channels, dtype=np.float32)  # RMS per channel
+        self.active = np.zeros(channels, dtype=bool)
+        self._power = np.zeros(channels, dtype=np.float32)
+        self._frames = np.zeros((chunk, channels), dtype=np.float32)
+        self._peak = np.zeros((), dtype=np.int16)
+        self._squares = np.zeros((chunk, channels), dtype=np.float32)
+        self._ones = np.ones(chunk, dtype=np.float32)
+        # Reducing a (chunk, channels) view along its long axis runs a scalar loop
+        # of `channels` elements per row; reducing `blocks` rows of contiguous
+        # `blocks * channels` samples first keeps it vectorised.
+        self._blocks = math.gcd(chunk, 32)
+        self._block_peaks = np.zeros((self._blocks, channels), dtype=np.int16)
+        Detector._bind_views(self)  # subclasses bind theirs once their buffers exist
+
+    def _bind_views(self):
+        """Create the views onto other buffers (pickling would turn them into copies)"""
+        self._float = self._frames.reshape(-1)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self._views:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind_views()
+
+    def __call__(self, samples):
+        """Analyze one chunk
+
+        Args:
+            samples (numpy.ndarray): Interleaved int16 samples of one chunk.
+
+        Returns:
+            bool: True if the chunk should count towards a trigger on any channel.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release or persist the detector state"""
+
+    def measure(self, samples):
+        if self.channels == 1:
+            np.maximum.reduce(samples, out=self._peak)
+            np.copyto(self._float, samples)
+            self.peak = int(self._peak)
+            self.rms = math.sqrt(float(np.dot(self._float, self._float)) / self.size)
+            self.peaks[0] = self.peak
+            self.levels[0] = self.rms
+            return
+
+        np.maximum.reduce(
+            samples.reshape(-1, self._blocks * self.channels),
+            axis=0,
+            out=self._block_peaks.reshape(-1),
+        )
+        np.maximum.reduce(self._block_peaks, axis=0, out=self.peaks)
+        np.copyto(self._frames, samples.reshape(self.chunk, self.channels))
+        np.square(self._frames, out=self._squares)
+        np.matmul(self._ones, self._squares, out=self._power)
+        np.sqrt(self._power / self.chunk, out=self.levels)
+        self.peak = int(self.peaks.max())
+        self.rms = math.sqrt(float(self._power.sum()) / self.size)
+
+
+class PeakDetector(Detector):
+    def __init__(self, chunk, channels, threshold):
+        """Peak-amplitude trigger working directly on int16 samples
+
+        Args:
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+            threshold (float): Normalized peak threshold in [0, 1].
+        """
+        super().__init__(chunk, channels)
+        self.threshold = to_int16_threshold(threshold)
+
+    def __call__(self, samples):
+        self.measure(samples)
+        np.greater(self.peaks, self.threshold, out=self.active)
+        return self.peak > self.threshold
+
+
+class GoertzelDetector(Detector):
+    _views = Detector._views + ("_projection_bins",)
+
+    def __init__(self, chunk, channels, rate, frequencies, power_ratio, min_level):
+        """Chime trigger based on a Goertzel filter bank
+
+        Each target frequency is evaluated as a single Hann-windowed DFT bin,
+        i.e. the Goertzel output, computed as one matrix product against a
+        precomputed cos/sin basis. The cost per chunk is fixed at
+        `2 * len(frequencies) * chunk * channels` multiply-adds.
+
+        A channel is active when its RMS is at least `min_level` and one of the
+        target frequencies carries at least `power_ratio` of its windowed
+        signal energy (an on-bin pure tone scores about 0.67).
+
+        Args:
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+            rate (int): Sample rate in Hz.
+            frequencies (list[float]): Chime frequencies in Hz.
+            power_ratio (float): Minimum energy ratio of a chime frequency in [0, 1].
+            min_level (float): Minimum normalized RMS level in [0, 1].
+        """
+        super().__init__(chunk, channels)
+        if not frequencies:
+            raise ValueError("GoertzelDetector needs at least one chime frequency.")
+        self.frequencies = list(frequencies)
+        self.power_ratio = power_ratio
+        self.min_rms = min_level * INT16_FULL_SCALE
+        # energy ratio per chime frequency and channel
+        self.ratios = np.zeros((len(self.frequencies), channels), dtype=np.float32)
+
+        n = np.arange(chunk)
+        self._window = np.hanning(chunk).astype(np.float32)[:, None]
+        self._basis = np.empty((2 * len(self.frequencies), chunk), dtype=np.float32)
+        for i, frequency in enumerate(self.frequencies):
+            omega = 2 * np.pi * frequency / rate
+            self._basis[2 * i] = self._window[:, 0] * np.cos(omega * n)
+            self._basis[2 * i + 1] = self._window[:, 0] * np.sin(omega * n)
+
+        self._windowed = np.zeros((chunk, channels), dtype=np.float32)
+        self._energy = np.zeros(channels, dtype=np.float32)
+        self._projection = np.zeros((2 * len(self.frequencies), channels), np.float32)
+        self._bind_views()
+
+    def _bind_views(self):
+        super()._bind_views()
+        self._projection_bins = self._projection.reshape(len(self.frequencies), 2, -1)
+
+    def __call__(self, samples):
+        self.measure(samples)
+        if (
+            self.rms * math.sqrt(self.channels) < self.min_rms
+        ):  # no channel is loud enough
+            self.ratios.fill(0)
+            self.active.fill(False)
+            return False
+
+        np.matmul(self._basis, self._frames, out=self._projection)
+        np.square(self._projection, out=self._projection)
+        np.sum(self._projection_bins, axis=1, out=self.ratios)
+
+        np.multiply(self._frames, self._window, out=self._windowed)
+        np.square(self._windowed, out=self._windowed)
+        np.matmul(self._ones, self._windowed, out=self._energy)
+        np.maximum(self._energy, 1.0, out=self._energy)
+        # Parseval: a bin pair (k, N - k) holds 2 * |X_k|^2 / (N * energy) of the energy
+        self.ratios *= 2 / (self.chunk * self._energy)
+        np.greater_equal(self.ratios.max(axis=0), self.power_ratio, out=self.active)
+        self.active &= self.levels >= self.min_rms
+        return bool(self.active.any())
+
+
+class AdaptiveDetector(Detector):
+    stateless = False
+
+    def __init__(
+        self,
+        chunk,
+        channels,
+        rate,
+        margin_db,
+        time_constant_sec,
+        min_level,
+        state_file=None,
+        save_interval_sec=60.0,
+        max_event_sec=10.0,
+    ):
+        """RMS trigger relative to a running estimate of the noise floor
+
+        Each channel has its own floor. The floor is an exponential moving average of the chunk level in dB,
+        O(1) per chunk. It follows quieter chunks ten times faster than louder
+        ones, so it drops quickly when the room calms down, while a ring of a
+        few seconds barely raises it. A level staying above the trigger for
+        longer than any ring (`max_event_sec`) is taken as new background
+        noise (air conditioning, washing machine) and followed at the fast rate.
+
+        The estimate is saved to `state_file` every `save_interval_sec` of
+        audio and on `close`, and loaded on start to skip the warm-up.
+
+        Args:
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+            rate (int): Sample rate in Hz.
+            margin_db (float): Trigger margin above the noise floor in dB.
+            time_constant_sec (float): Time constant of the rising floor in seconds.
+            min_level (float): Minimum normalized RMS level in [0, 1].
+            state_file (str, optional): JSON file keeping the floor across restarts.
+            save_interval_sec (float, optional): Save period in seconds of audio. (default: `60.0`)
+            max_event_sec (float, optional): Longest expected ring in seconds. (default: `10.0`)
+        """
+        super().__init__(chunk, channels)
+        self.margin_db = margin_db
+        self.min_rms = min_level * INT16_FULL_SCALE
+        chunk_sec = chunk / rate
+        self.alpha_up = 1 - math.exp(-chunk_sec / time_constant_sec)
+        self.alpha_down = 1 - math.exp(-chunk_sec * 10 / time_constant_sec)
+        self.state_file = state_file
+        self.save_interval = max(int(save_interval_sec / chunk_sec), 1)
+        self.max_event_chunks = int(max_event_sec / chunk_sec)
+        self.active_chunks = np.zeros(channels, dtype=np.int64)
+        self.level_db = np.zeros(channels)
+        self.floor_db = self._load()
+        self._alpha = np.zeros(channels)
+        self._chunks = 0
+
+    @property
+    def threshold(self):
+        """Current trigger level per channel as int16 RMS values"""
+        if self.floor_db is None:
+            return np.full(self.channels, np.inf)
+        return np.maximum(10 ** ((self.floor_db + self.margin_db) / 20), self.min_rms)
+
+    def __call__(self, samples):
+        self.measure(samples)
+        np.log10(np.maximum(self.levels, 1.0), out=self.level_db)
+        self.level_db *= 20
+        if self.floor_db is None:
+            self.floor_db = self.level_db.copy()
+        np.greater_equal(self.level_db, self.floor_db + self.margin_db, out=self.active)
+        self.active &= self.levels >= self.min_rms
+
+        self.active_chunks += 1
+        self.active_chunks *= self.active
+        fast = (self.level_db < self.floor_db) | (
+            self.active_chunks > self.max_event_chunks
+        )
+        np.copyto(self._alpha, np.where(fast, self.alpha_down, self.alpha_up))
+        self.floor_db += self._alpha * (self.level_db - self.floor_db)
+
+        self._chunks += 1
+        if self._chunks % self.save_interval == 0:
+            self.save()
+        return bool(self.active.any())
+
+    def close(self):
+        self.save()
+
+    def _load(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                floor_db = np.array(json.load(f)["floor_db"], dtype=float)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if floor_db.size not in (1, self.channels):
+            return None  # saved for another channel layout
+        return np.resize(floor_db, self.channels)
+
+    def save(self):
+        """Write the noise floor to `state_file` (atomically)"""
+        if not self.state_file or self.floor_db is None:
+            return
+        tmp = f"{self.state_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"floor_db": self.floor_db.tolist(), "time": time.time()}, f)
+            os.replace(tmp, self.state_file)
+        except OSError:
+            pass
@@ -0,0 +1,201 @@
+import math
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_MULAW = 7
+CODECS = {"pcm": (WAVE_FORMAT_PCM, 2), "ulaw": (WAVE_FORMAT_MULAW, 1)}
+
+
+def lowpass_filter(up, taps_per_phase, down, beta=8.0, cutoff=0.9):
+    """Kaiser-windowed sinc low-pass filter for resampling by `up / down`
+
+    Args:
+        up (int): Interpolation factor.
+        taps_per_phase (int): Taps of each polyphase branch.
+        down (int): Decimation factor.
+        beta (float, optional): Kaiser window parameter. (default: `8.0`)
+        cutoff (float, optional): Cutoff relative to the lower Nyquist frequency. \
+            (default: `0.9`)
+
+    Returns:
+        numpy.ndarray: `up * taps_per_phase` float64 taps, with a gain of `up`.
+    """
+    n = up * taps_per_phase
+    cutoff = cutoff / max(up, down)  # of the upsampled Nyquist frequency
+    t = np.arange(n) - (n - 1) / 2
+    return up * cutoff * np.sinc(cutoff * t) * np.kaiser(n, beta)
+
+
+class PolyphaseResampler:
+    def __init__(self, rate_in, rate_out, width=16):
+        """Streaming rational resampler for one channel
+
+        Upsampling by `up`, filtering and decimating by `down` only computes
+        the output samples: each one is a dot product of a few input samples
+        with one branch of the polyphase filter. The last
+        input samples are kept between calls, so a clip can be resampled
+        chunk by chunk without seams.
+
+        Args:
+            rate_in (int): Input sample rate in Hz.
+            rate_out (int): Output sample rate in Hz.
+            width (int, optional): Filter span in samples at the lower of the two \
+                rates; wider is sharper and slower. (default: `16`)
+        """
+        g = math.gcd(rate_in, rate_out)
+        self.up = rate_out // g
+        self.down = rate_in // g
+        self.taps = -(-width * max(self.up, self.down) // self.up)
+        h = lowpass_filter(self.up, self.taps, self.down)
+        # branch p holds h[p], h[p + up], ...; reversed to line up with the input
+        self._branches = h.reshape(self.taps, self.up).T[:, ::-1].copy()
+        self._history = np.zeros(self.taps - 1)
+        self._next = 0  # upsampled index of the next output, from the chunk start
+
+    def output_size(self, n):
+        """Number of samples `n` input samples resample to (from a fresh state)"""
+        return -(-n * self.up // self.down)
+
+    def __call__(self, samples):
+        """Resample one chunk
+
+        Args:
+            samples (numpy.ndarray): Input samples.
+
+        Returns:
+            numpy.ndarray: float64 output samples.
+        """
+        n = samples.size
+        buffer = np.concatenate((self._history, samples))
+        positions = np.arange(self._next, n * self.up, self.down)
+        windows = np.lib.stride_tricks.sliding_window_view(buffer, self.taps)
+        out = np.einsum(
+            "ij,ij->i",
+            windows[positions // self.up],
+            self._branches[positions % self.up],
+        )
+        last = positions[-1] if positions.size else self._next - self.down
+        self._next = last + self.down - n * self.up
+        self._history = buffer[buffer.size - self.taps + 1 :]
+        return out
+
+
+def ulaw_encode(samples):
+    """G.711 μ-law encoding
+
+    Args:
+        samples (numpy.ndarray): int16 samples.
+
+    Returns:
+        numpy.ndarray: uint8 codes, one per sample.
+    """
+    x = samples.astype(np.int32) >> 2  # on 14 bits, as in the reference coder
+    mask = np.where(x < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(x), 8158) + 0x21  # top of segment 7
+    segment = np.frexp(magnitude)[1] - 6
+    code = (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+    return (code ^ mask).astype(np.uint8)
+
+
+def ulaw_decode(codes):
+    """Inverse of `ulaw_encode`
+
+    Args:
+        codes (numpy.ndarray): uint8 codes.
+
+    Returns:
+        numpy.ndarray: int16 samples.
+    """
+    u = ~codes.astype(np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    magnitude = (((u & 0x0F) << 3) + 0x84 << exponent) - 0x84
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+class AudioEncoder:
+    def __init__(self, rate, channels, rate_out=0, mono=False, codec="pcm"):
+        """Encoding stage between the recording and the upload
+
+        Chunks go through a downmix to mono, a polyphase resampler and a
+        codec, each one optional. Chunks are encoded as they come, so the
+        upload can still stream.
+
+        Args:
+            rate (int): Capture sample rate in Hz.
+            channels (int): Interleaved channels of the recorded chunks.
+            rate_out (int, optional): Upload sample rate in Hz, at most the capture \
+                rate: upsampling only makes the upload larger. (default: `0`, capture rate)
+            mono (bool, optional): Average the channels. (default: `False`)
+            codec (str, optional): `pcm` (16-bit) or `ulaw` (8-bit G.711 μ-law). \
+                (default: `pcm`)
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        self.channels_in = channels
+        self.channels = 1 if mono else channels
+        self.rate = min(rate_out or rate, rate)
+        self.codec = codec
+        self.format_tag, self.sample_width = CODECS[codec]
+        self.is_identity = (
+            self.rate == rate and self.channels == channels and codec == "pcm"
+        )
+        self._resamplers = None
+        if self.rate != rate:
+            self._resamplers = [
+                PolyphaseResampler(rate, self.rate) for _ in range(self.channels)
+            ]
+
+    @property
+    def content_type(self):
+        """MIME type of the encoded WAV, with the WAVE format tag (RFC 2361)"""
+        if self.format_tag == WAVE_FORMAT_PCM:
+            return "audio/wav"
+        return f"audio/wav; codec={self.format_tag}"
+
+    @property
+    def description(self):
+        """Format declared next to the upload, e.g. `ulaw/8000/1`"""
+        return f"{self.codec}/{self.rate}/{self.channels}"
+
+    def data_size(self, n_frames):
+        """Size of the encoded data of `n_frames` captured frames"""
+        if self._resamplers is not None:
+            n_frames = self._resamplers[0].output_size(n_frames)
+        return n_frames * self.channels * self.sample_width
+
+    def silence(self, size):
+        """`size` bytes of encoded silence"""
+        if self.codec == "ulaw":
+            return ulaw_encode(np.zeros(1, dtype=np.int16)).tobytes() * size
+        return bytes(size)
+
+    def __call__(self, frame):
+        """Encode one chunk
+
+        Args:
+            frame (bytes): Interleaved int16 samples.
+
+        Returns:
+            bytes: Encoded samples.
+        """
+        if self.is_identity:
+            return frame
+        samples = np.frombuffer(frame, dtype=np.int16)
+        if self.channels_in > 1:
+            samples = samples.reshape(-1, self.channels_in)
+            if self.channels == 1:
+                samples = samples.mean(axis=1)
+        if self._resamplers is not None:
+            if self.channels == 1:
+                samples = self._resamplers[0](samples)
+            else:
+                samples = np.stack(
+                    [r(samples[:, c]) for c, r in enumerate(self._resamplers)],
+                    axis=1,
+                )
+        if samples.dtype != np.int16:
+            samples = np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+        if self.codec == "ulaw":
+            return ulaw_encode(samples).tobytes()
+        return samples.tobytes()
@@ -0,0 +1,124 @@
+from collections import deque
+
+import numpy as np
+
+from app.src.audio.detector import INT16_FULL_SCALE
+
+
+class Endpointer:
+    def __init__(
+        self,
+        chunk,
+        channels,
+        rate,
+        silence_sec,
+        min_sec=1.0,
+        pad_sec=0.2,
+        margin_db=10.0,
+        min_level=0.01,
+        zcr_threshold=0.25,
+    ):
+        """Streaming voice-activity endpointer for passphrase clips
+
+        Each chunk is classified from its RMS and zero-crossing rate (first
+        channel only): loud chunks are speech, and so are quieter ones with
+        many zero crossings (fricatives such as "s" or "f"). The noise level
+        is tracked as a running minimum of the RMS. About two dot products
+        per chunk, cheap enough for a Pi Zero.
+
+        Args:
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+            rate (int): Sample rate in Hz.
+            silence_sec (float): Trailing silence that ends the clip.
+            min_sec (float, optional): Audio kept after the trigger before the clip \
+                can end (the chime usually rings on past it). (default: `1.0`)
+            pad_sec (float, optional): Silence kept before and after the speech. (default: `0.2`)
+            margin_db (float, optional): Speech level above the noise level. (default: `10.0`)
+            min_level (float, optional): Lowest speech RMS, normalized to [0, 1]. (default: `0.01`)
+            zcr_threshold (float, optional): Zero-crossing rate of fricatives, \
+                crossings per sample. (default: `0.25`)
+        """
+        self.chunk = chunk
+        self.channels = channels
+        chunks_per_sec = rate / chunk
+        self.silence_chunks = max(int(round(silence_sec * chunks_per_sec)), 1)
+        self.min_chunks = int(round(min_sec * chunks_per_sec))
+        self.pad_chunks = int(round(pad_sec * chunks_per_sec))
+        self.margin = 10 ** (margin_db / 20)
+        self.noise_rise = 10 ** (6 / 20 / chunks_per_sec)  # 6 dB per second
+        self.min_level = min_level * INT16_FULL_SCALE
+        self.zcr_threshold = zcr_threshold
+        self.noise = self.min_level / self.margin
+        self.rms = 0.0
+        self.zcr = 0.0
+        self.trimmed = 0  # chunks dropped from the last clip
+        self._samples = np.zeros(chunk, dtype=np.float32)
+
+    def is_speech(self, frame):
+        """Classify one chunk
+
+        Args:
+            frame (bytes): Interleaved int16 samples of one chunk.
+
+        Returns:
+            bool: True if the chunk holds speech.
+        """
+        samples = np.frombuffer(frame, dtype=np.int16)[:: self.channels]
+        x = self._samples[: samples.size]
+        np.copyto(x, samples, casting="unsafe")
+        self.rms = rms = float(np.sqrt(np.dot(x, x) / max(x.size, 1)))
+        signs = np.signbit(x)
+        self.zcr = np.count_nonzero(signs[1:] != signs[:-1]) / max(x.size, 1)
+
+        # the noise level follows drops at once and rises slowly
+        self.noise = min(rms, self.noise * self.noise_rise)
+        threshold = max(self.min_level, self.noise * self.margin)
+        if rms >= threshold:
+            return True
+        return self.zcr >= self.zcr_threshold and rms >= threshold / 2
+
+    def trim(self, frames, hold=0):
+        """Drop leading and trailing silence, and stop after trailing silence
+
+        Leading chunks are held back until the first speech, then only the
+        last `pad_chunks` of them are passed on (all of them if the clip
+        has no speech at all). Silent chunks after speech are held back too,
+        and the clip ends once `silence_chunks` of them follow each other.
+
+        Args:
+            frames (Iterable[bytes]): Chunks of the clip, as they are captured.
+            hold (int, optional): Chunks at the start of the clip before the trigger \
+                (the pre-roll); the clip cannot end in its first `hold + min_chunks`.
+
+        Yields:
+            bytes: Chunks to keep.
+        """
+        self.trimmed = 0
+        self.noise = self.min_level / self.margin
+        leading = []
+        trailing = deque()
+        has_speech = False
+        for i, frame in enumerate(frames):
+            if self.is_speech(frame):
+                if not has_speech:
+                    has_speech = True
+                    kept = leading[max(len(leading) - self.pad_chunks, 0) :]
+                    self.trimmed += len(leading) - len(kept)
+                    leading = None
+                    yield from kept
+                yield from trailing
+                trailing.clear()
+                yield frame
+            elif not has_speech:
+                leading.append(frame)
+            else:
+                trailing.append(frame)
+                if len(trailing) >= self.silence_chunks and i >= hold + self.min_chunks:
+                    break
+        if not has_speech:
+            yield from leading
+            return
+        kept = list(trailing)[: self.pad_chunks]
+        self.trimmed += len(trailing) - len(kept)
+        yield from kept
@@ -0,0 +1,184 @@
+import multiprocessing
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from app.src.audio.bus import map_bus
+
+_worker = {}
+
+
+def _init_worker(name, chunk, channels, capacity, detector, front_end):
+    # spawned workers share the parent's resource tracker, which unlinks the block once
+    shm = shared_memory.SharedMemory(name=name)
+    _worker["shm"] = shm
+    _worker["written"], _worker["frames"] = map_bus(shm.buf, chunk, channels, capacity)
+    _worker["detector"] = pickle.loads(detector)
+    _worker["front_end"] = pickle.loads(front_end)
+
+
+def _ping():
+    return True
+
+
+def _analyse(positions):
+    """Run the detector over bus chunks, read in place (in a worker)
+
+    A chunk is analysed only while it is not before `AudioBus.oldest()`, and
+    its result is kept only if the slot was not refilled during the analysis.
+
+    Args:
+        positions (list[int]): Bus positions of the chunks.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]: Per chunk: \
+            active channels, peak, RMS and whether it was analysed.
+    """
+    detector = _worker["detector"]
+    front_end = _worker["front_end"]
+    written = _worker["written"]
+    frames = _worker["frames"]
+    capacity = len(frames)
+    n = len(positions)
+    active = np.zeros((n, detector.channels), dtype=bool)
+    peaks = np.zeros(n, dtype=np.int32)
+    rms = np.zeros(n, dtype=np.float64)
+    analysed = np.zeros(n, dtype=bool)
+    for i, position in enumerate(positions):
+        if written[0] - position > capacity - 2:
+            continue  # before `AudioBus.oldest()`: about to be refilled
+        samples = frames[position % capacity]
+        if front_end is not None:
+            samples = front_end(samples)
+        detector(samples)
+        if written[0] - position >= capacity:
+            continue  # refilled while it was analysed
+        active[i] = detector.active
+        peaks[i] = detector.peak
+        rms[i] = detector.rms
+        analysed[i] = True
+    return active, peaks, rms, analysed
+
+
+def _collect_detector():
+    return pickle.dumps(_worker["detector"])
+
+
+class AnalysisOffload:
+    def __init__(
+        self, bus, detector, batch_chunks=2, slots=8, workers=1, front_end=None
+    ):
+        """Run a detector in a process pool over chunks of an audio bus
+
+        The workers map the bus's shared memory and read the chunks in place:
+        only bus positions cross the process boundary, and the workers return
+        the (small) per-chunk results. Workers are started with `spawn`, so
+        they share no locks with the audio threads. A chunk the producer has
+        overwritten before a worker got to it is not analysed.
+
+        At most `slots` batches are in flight. When all are busy the batch is
+        not analysed (counted in `dropped`), so a slow analysis never blocks
+        the capture.
+
+        The object stands in for the detector in the parent process: `load`
+        puts the result of one chunk into `active`, `peak` and `rms`.
+
+        Args:
+            bus (AudioBus): Bus the chunks are read from.
+            detector (Detector): Detector to run; stateful detectors get a single worker.
+            batch_chunks (int, optional): Chunks per batch. (default: `2`)
+            slots (int, optional): Batches in flight. (default: `8`)
+            workers (int, optional): Worker processes. (default: `1`)
+            front_end (Decimator, optional): Filter run before the detector; it \
+                keeps state across chunks, so it also gets a single worker.
+        """
+        self.detector = detector
+        self.channels = detector.channels
+        self.batch_chunks = max(int(batch_chunks), 1)
+        self.workers = workers
+        if not detector.stateless or front_end is not None:
+            self.workers = 1
+        self.active = np.zeros(self.channels, dtype=bool)
+        self.peak = 0
+        self.rms = 0.0
+        self.dropped = 0  # batches
+        self.missed = 0  # chunks overwritten before they were analysed
+
+        self._free = deque(range(max(int(slots), 1)))
+        self.pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                bus.name,
+                bus.chunk,
+                bus.channels,
+                bus.capacity,
+                pickle.dumps(detector),
+                pickle.dumps(front_end),
+            ),
+        )
+
+    def start(self):
+        """Start the workers (blocking), so the first batch does not wait for them"""
+        for future in [self.pool.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def submit(self, positions):
+        """Analyse a batch of bus chunks in the pool
+
+        Args:
+            positions (list[int]): Bus positions, at most `batch_chunks` chunks.
+
+        Returns:
+            concurrent.futures.Future | None: Result of `_analyse`, or None if all \
+                slots were busy.
+        """
+        if not self._free:
+            self.dropped += 1
+            return None
+        slot = self._free.popleft()
+        future = self.pool.submit(_analyse, list(positions))
+        future.add_done_callback(lambda _: self._free.append(slot))
+        return future
+
+    def load(self, result, i):
+        """Expose the result of chunk `i` of a batch as the current detector output
+
+        Args:
+            result (tuple | None): Return value of `_analyse`, None for a dropped batch.
+            i (int): Chunk index in the batch.
+
+        Returns:
+            bool: Whether the chunk was analysed.
+        """
+        if result is None:
+            self.active.fill(False)
+            return False
+        active, peaks, rms, analysed = result
+        if not analysed[i]:
+            self.missed += 1
+            self.active.fill(False)
+            return False
+        np.copyto(self.active, active[i])
+        self.peak = int(peaks[i])
+        self.rms = float(rms[i])
+        return True
+
+    def close(self):
+        """Stop the workers
+
+        Returns:
+            Detector: The detector with the state it reached in the worker.
+        """
+        try:
+            self.detector = pickle.loads(
+                self.pool.submit(_collect_detector).result(timeout=5)
+            )
+        except Exception:
+            pass  # keep the initial detector
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        return self.detector
@@ -0,0 +1,92 @@
+import threading
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    def __init__(self, chunk, channels, capacity):
+        """Fixed-size single-producer / single-consumer ring buffer of audio chunks
+
+        The producer (PortAudio callback thread) and the consumer (detection loop)
+        never share a lock on the data path: each side only advances its own
+        counter, and the producer drops the incoming chunk instead of overwriting
+        a slot the consumer has not read yet.
+
+        Args:
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+            capacity (int): Number of chunks the buffer can hold.
+        """
+        self.chunk = chunk
+        self.channels = channels
+        self.capacity = max(int(capacity), 1)
+        self._buffer = np.zeros((self.capacity, chunk * channels), dtype=np.int16)
+        self._written = 0
+        self._read = 0
+        self._data_ready = threading.Event()
+        self.overruns = 0
+        self.input_overflows = 0
+
+    def write(self, data):
+        """Write one chunk (called from the producer thread)
+
+        Args:
+            data (bytes): Interleaved int16 samples of one chunk.
+
+        Returns:
+            bool: False if the buffer was full and the chunk was dropped.
+        """
+        if self._written - self._read >= self.capacity:
+            self.overruns += 1
+            return False
+        self._buffer[self._written % self.capacity] = np.frombuffer(
+            data, dtype=np.int16
+        )
+        self._written += 1
+        self._data_ready.set()
+        return True
+
+    def read(self, timeout=None):
+        """Read the oldest unread chunk (called from the consumer thread)
+
+        Args:
+            timeout (float, optional): Seconds to wait for data. (default: wait forever)
+
+        Returns:
+            bytes: Interleaved int16 samples of one chunk.
+        """
+        self._wait(timeout)
+        data = self._buffer[self._read % self.capacity].tobytes()
+        self._read += 1
+        return data
+
+    def read_into(self, out, timeout=None):
+        """Copy the oldest unread chunk into a preallocated array
+
+        Args:
+            out (numpy.ndarray): int16 array of `chunk * channels` samples.
+            timeout (float, optional): Seconds to wait for data. (default: wait forever)
+
+        Returns:
+            numpy.ndarray: `out`
+        """
+        self._wait(timeout)
+        np.copyto(out, self._buffer[self._read % self.capacity])
+        self._read += 1
+        return out
+
+    def _wait(self, timeout):
+        while self._read >= self._written:
+            self._data_ready.clear()
+            if self._read < self._written:
+                break
+            if not self._data_ready.wait(timeout):
+                raise TimeoutError("No audio chunk received from the stream.")
+
+    def clear(self):
+        """Drop the unread chunks (while no producer is running)"""
+        self._read = self._written
+        self._data_ready.clear()
+
+    def __len__(self):
+        return self._written - self._read
@@ -0,0 +1,344 @@
+import wave
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pyaudio
+
+from app.src.audio.ring_buffer import AudioRingBuffer
+from app.utils import logger, metrics
+
+audio_stalls_total = metrics.counter(
+    "audio_stalls_total",
+    "Audio streams that delivered no chunk within the stall timeout",
+)
+audio_reopens_total = metrics.counter(
+    "audio_stream_reopens_total", "Audio streams re-opened after an error or a stall"
+)
+
+
+class AudioStallError(TimeoutError):
+    """No audio chunk arrived within the stall timeout"""
+
+
+class AudioSource:
+    sample_width = 2  # int16
+    is_live = False  # a finite input read as fast as it is consumed
+
+    def __init__(self, rate, chunk, channels):
+        """Base class of the chunked int16 audio inputs
+
+        Args:
+            rate (int): Sample rate in Hz.
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+        """
+        self.rate = rate
+        self.chunk = chunk
+        self.channels = channels
+
+    def is_active(self):
+        """Whether more chunks can be read"""
+        raise NotImplementedError
+
+    def read_into(self, out):
+        """Read one chunk into a preallocated array
+
+        Args:
+            out (numpy.ndarray): int16 array of `chunk * channels` samples.
+
+        Returns:
+            numpy.ndarray: `out`
+        """
+        raise NotImplementedError
+
+    def read(self):
+        """Read one chunk
+
+        Returns:
+            bytes: Interleaved int16 samples of one chunk.
+        """
+        out = np.empty(self.chunk * self.channels, dtype=np.int16)
+        return self.read_into(out).tobytes()
+
+    def recover(self):
+        """Make the source readable again after a read error
+
+        Returns:
+            bool: True if the input had to be re-opened.
+        """
+        return False
+
+    def close(self):
+        pass
+
+
+class PyAudioSource(AudioSource):
+    is_live = True  # chunks arrive in real time whether they are read or not
+
+    def __init__(
+        self,
+        rate,
+        chunk,
+        channels,
+        capture_mode="blocking",
+        ring_buffer_chunks=1,
+        device=None,
+        stall_timeout=0,
+    ):
+        """Live input from a PortAudio device
+
+        In `callback` capture mode PortAudio pushes every chunk into a
+        preallocated ring buffer from its own thread, so a stalled main loop
+        no longer overflows the device buffer.
+
+        In `callback` mode a read that gets no chunk from the ring buffer
+        within `stall_timeout` seconds raises `AudioStallError`. A blocking
+        read cannot be timed out safely, since the stream may only be used
+        from the reading thread, so `blocking` mode has no stall detection.
+        After a stall or a read error, `recover` re-opens the stream on the
+        same PortAudio instance.
+
+        Args:
+            rate (int): Sample rate in Hz.
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+            capture_mode (str, optional): `blocking` or `callback`. (default: `"blocking"`)
+            ring_buffer_chunks (int, optional): Ring buffer capacity in chunks. (default: `1`)
+            device (int, optional): Input device index. (default: default device)
+            stall_timeout (float, optional): Seconds without a chunk that make a stall \
+                in `callback` mode. (default: `0`, 1 second)
+        """
+        super().__init__(rate, chunk, channels)
+        self.format = pyaudio.paInt16
+        self.capture_mode = capture_mode
+        self.device = device
+        self.ring_buffer = None
+        self.reported_overruns = 0
+        self.read_timeout = stall_timeout or 1.0
+        self.failed = False  # a read failed: re-open the stream before reading again
+        if capture_mode == "callback":
+            self.ring_buffer = AudioRingBuffer(chunk, channels, ring_buffer_chunks)
+            self._register_metrics()
+        self.audio = pyaudio.PyAudio()
+        self.stream = self._open_stream()
+        if stall_timeout > 0 and self.ring_buffer is None:
+            logger.info("No audio stall detection in blocking capture mode.")
+
+    def _register_metrics(self):
+        ring_buffer = self.ring_buffer
+        labels = None if self.device is None else {"device": self.device}
+        metrics.gauge(
+            "audio_ring_buffer_chunks",
+            "Chunks waiting in the capture ring buffer",
+            lambda: len(ring_buffer),
+            labels,
+        )
+        metrics.gauge(
+            "audio_ring_buffer_overruns",
+            "Chunks dropped because the ring buffer was full",
+            lambda: ring_buffer.overruns,
+            labels,
+        )
+        metrics.gauge(
+            "audio_input_overflows",
+            "Input overflows reported by PortAudio",
+            lambda: ring_buffer.input_overflows,
+            labels,
+        )
+
+    def _open_stream(self):
+        params = {
+            "format": self.format,
+            "channels": self.channels,
+            "rate": self.rate,
+            "input": True,
+            "frames_per_buffer": self.chunk,
+        }
+        if self.device is not None:
+            params["input_device_index"] = self.device
+        if self.ring_buffer is not None:
+            params["stream_callback"] = self._stream_callback
+        logger.info(
+            f"Open audio stream. capture_mode: {self.capture_mode}, device: {self.device}"
+        )
+        return self.audio.open(**params)
+
+    def _stream_callback(self, in_data, frame_count, time_info, status_flags):
+        if status_flags & pyaudio.paInputOverflow:
+            self.ring_buffer.input_overflows += 1
+        self.ring_buffer.write(in_data)
+        return (None, pyaudio.paContinue)
+
+    def is_active(self):
+        return self.stream.is_active()
+
+    @contextmanager
+    def _reading(self):
+        try:
+            yield
+        except TimeoutError as e:
+            self.failed = True
+            audio_stalls_total.inc()
+            raise AudioStallError(
+                f"No audio chunk for {self.read_timeout * 1000:.0f} ms. "
+                f"device: {self.device}"
+            ) from e
+        except OSError:
+            self.failed = True
+            raise
+
+    def read(self):
+        with self._reading():
+            if self.ring_buffer is None:
+                return self.stream.read(self.chunk)
+            data = self.ring_buffer.read(timeout=self.read_timeout)
+        self._report_overruns()
+        return data
+
+    def read_into(self, out):
+        with self._reading():
+            if self.ring_buffer is None:
+                data = self.stream.read(self.chunk)
+                np.copyto(out, np.frombuffer(data, dtype=np.int16))
+                return out
+            self.ring_buffer.read_into(out, timeout=self.read_timeout)
+        self._report_overruns()
+        return out
+
+    def _report_overruns(self):
+        dropped = self.ring_buffer.overruns + self.ring_buffer.input_overflows
+        if dropped != self.reported_overruns:
+            logger.warning(
+                f"Audio chunks dropped. ring buffer overruns: {self.ring_buffer.overruns}, "
+                f"input overflows: {self.ring_buffer.input_overflows}"
+            )
+            self.reported_overruns = dropped
+
+    def recover(self):
+        if not (self.failed or not self.stream.is_active()):
+            return False
+        self.reopen()
+        return True
+
+    def reopen(self):
+        """Close the stream and open a new one on the same PortAudio instance
+
+        Only the stream is replaced: PortAudio is not terminated, so the
+        devices are not probed again. Chunks left in the ring buffer from
+        before the failure are dropped.
+        """
+        self._stop_stream()
+        try:
+            self.stream.close()
+        except OSError:
+            pass  # the device is gone
+        if self.ring_buffer is not None:
+            self.ring_buffer.clear()
+        self.stream = self._open_stream()
+        self.failed = False
+        audio_reopens_total.inc()
+
+    def _stop_stream(self):
+        try:
+            self.stream.stop_stream()
+        except OSError:
+            pass  # already stopped, or the device is gone
+
+    def close(self):
+        self._stop_stream()
+        self.stream.close()
+        self.audio.terminate()
+
+
+class FileSource(AudioSource):
+    def __init__(self, path, chunk, rate=None, channels=None):
+        """Replay of a WAV file or a headerless int16 PCM file
+
+        Args:
+            path (str | pathlib.Path): `.wav` file, or raw PCM (`.raw`, `.pcm`).
+            chunk (int): Number of frames per chunk.
+            rate (int, optional): Sample rate of a raw file in Hz.
+            channels (int, optional): Number of channels of a raw file.
+        """
+        self.path = Path(path)
+        if self.path.suffix.lower() == ".wav":
+            with wave.open(str(self.path), "rb") as wf:
+                if wf.getsampwidth() != self.sample_width:
+                    raise ValueError(f"{self.path} is not a 16-bit WAV file.")
+                rate, channels = wf.getframerate(), wf.getnchannels()
+                data = wf.readframes(wf.getnframes())
+        else:
+            if rate is None or channels is None:
+                raise ValueError("rate and channels are required for raw PCM files.")
+            data = self.path.read_bytes()
+        super().__init__(rate, chunk, channels)
+        self._samples = np.frombuffer(data, dtype=np.int16)
+        self._position = 0
+
+    @property
+    def duration(self):
+        return self._samples.size / self.channels / self.rate
+
+    def is_active(self):
+        return self._position < self._samples.size
+
+    def read_into(self, out):
+        if not self.is_active():
+            raise EOFError(f"End of {self.path}.")
+        block = self._samples[self._position : self._position + out.size]
+        out[: block.size] = block
+        out[block.size :] = 0
+        self._position += out.size
+        return out
+
+
+class SyntheticSource(AudioSource):
+    def __init__(
+        self,
+        rate,
+        chunk,
+        channels,
+        duration,
+        chimes=(),
+        noise_level=0.01,
+        seed=0,
+    ):
+        """Generated background noise with sine-tone chimes
+
+        Args:
+            rate (int): Sample rate in Hz.
+            chunk (int): Number of frames per chunk.
+            channels (int): Number of interleaved channels per frame.
+            duration (float): Length of the signal in seconds.
+            chimes (Iterable[tuple]): `(start_sec, length_sec, frequency_hz, level)`
+                for each tone, `level` being the normalized amplitude.
+            noise_level (float, optional): Normalized RMS of the white noise. (default: `0.01`)
+            seed (int, optional): Random seed of the noise. (default: `0`)
+        """
+        super().__init__(rate, chunk, channels)
+        self.duration = duration
+        self.chimes = list(chimes)
+        self.noise_level = noise_level
+        self._total_frames = int(duration * rate)
+        self._frame = 0
+        self._rng = np.random.default_rng(seed)
+        self._t = np.arange(chunk, dtype=np.float64)
+        self._mono = np.zeros(chunk, dtype=np.float64)
+
+    def is_active(self):
+        return self._frame < self._total_frames
+
+    def read_into(self, out):
+        if not self.is_active():
+            raise EOFError("End of synthetic signal.")
+        t = (self._frame + self._t) / self.rate
+        self._mono[:] = self._rng.normal(0, self.noise_level, self.chunk)
+        for start, length, frequency, level in self.chimes:
+            on = (t >= start) & (t < start + length)
+            self._mono += on * level * np.sin(2 * np.pi * frequency * t)
+        np.clip(self._mono, -1, 1, out=self._mono)
+        frames = out.reshape(self.chunk, self.channels)
+        frames[:] = (self._mono * 32767)[:, None]
+        self._frame += self.chunk
+        return out
@@ -0,0 +1,98 @@
+import struct
+
+
+def encode_wav(frames, channels, rate, sample_width=2, format_tag=1):
+    """Build a WAV container in memory
+
+    Args:
+        frames (Iterable[bytes]): Interleaved chunks.
+        channels (int): Number of channels.
+        rate (int): Sample rate in Hz.
+        sample_width (int, optional): Bytes per sample. (default: `2`)
+        format_tag (int, optional): WAVE format tag, 1 for PCM, 7 for μ-law. (default: `1`)
+
+    Returns:
+        bytes: WAV file content
+    """
+    data = b"".join(frames)
+    return wav_header(len(data), channels, rate, sample_width, format_tag) + data
+
+
+def wav_header(data_size, channels, rate, sample_width=2, format_tag=1):
+    """Build the 44-byte header of a WAV file
+
+    Args:
+        data_size (int): Size of the data in bytes.
+        channels (int): Number of channels.
+        rate (int): Sample rate in Hz.
+        sample_width (int, optional): Bytes per sample. (default: `2`)
+        format_tag (int, optional): WAVE format tag, 1 for PCM, 7 for μ-law. (default: `1`)
+
+    Returns:
+        bytes: WAV header
+    """
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        format_tag,
+        channels,
+        rate,
+        rate * block_align,
+        block_align,
+        sample_width * 8,
+        b"data",
+        data_size,
+    )
+
+
+def iter_multipart_wav(
+    frames,
+    data_size,
+    channels,
+    rate,
+    boundary,
+    sample_width=2,
+    filename="test.wav",
+    format_tag=1,
+    content_type="audio/wav",
+    fields=None,
+):
+    """Stream a WAV file as a `multipart/form-data` body while frames are produced
+
+    The header is sent first, so `data_size` has to be known in advance and
+    `frames` has to add up to it.
+
+    Args:
+        frames (Iterable[bytes]): Interleaved PCM chunks, `data_size` bytes in total.
+        data_size (int): Size of the PCM data in bytes.
+        channels (int): Number of channels.
+        rate (int): Sample rate in Hz.
+        boundary (str): Multipart boundary.
+        sample_width (int, optional): Bytes per sample. (default: `2`)
+        filename (str, optional): File name of the `file` field. (default: `"test.wav"`)
+        format_tag (int, optional): WAVE format tag. (default: `1`, PCM)
+        content_type (str, optional): Content type of the `file` field. (default: `"audio/wav"`)
+        fields (dict[str, str], optional): Form fields sent before the file.
+
+    Yields:
+        bytes: Body parts
+    """
+    for name, value in (fields or {}).items():
+        yield (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+        ).encode()
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    yield wav_header(data_size, channels, rate, sample_width, format_tag)
+    yield from frames
+    yield f"\r\n--{boundary}--\r\n".encode()
@@ -1,2 +1,3 @@
 from app.src.auto_unlock.auto_unlock_app import AutoUnlockApp
 from app.src.auto_unlock.auto_unlock_app_w_auth import AutoUnlockAppWAuth
+from app.src.auto_unlock.multi_entrance import MultiEntranceApp
@@ -1,53 +1,94 @@
 #!/usr/bin/env python
 
+import os
+import time
+
 import numpy as np
-import pyaudio
 
+from app.src.audio import (
+    AdaptiveDetector,
+    Decimator,
+    GoertzelDetector,
+    PeakDetector,
+    PyAudioSource,
+)
+from app.src.audio.detector import to_int16_threshold
 from app.src.switch_bot.switch_bot import SwitchBot
-from app.utils import logger, settings, slack
+from app.utils import EntranceInfo, logger, metrics, settings, slack, tracer
+
+chunk_latency = metrics.histogram(
+    "auto_unlock_chunk_seconds",
+    "Time to analyse one audio chunk",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1),
+)
+chunks_total = metrics.counter("auto_unlock_chunks_total", "Audio chunks analysed")
+events_total = metrics.counter("auto_unlock_events_total", "Event calls fired")
+unlocks_total = metrics.counter("auto_unlock_unlocks_total", "Unlock commands sent")
 
 
 class AutoUnlockApp:
-    def __init__(self):
-        logger.info("Initialize AutoUnlockApp.")
-        self.audio = pyaudio.PyAudio()
-        self.stream = self.audio.open(
-            format=settings.FORMAT,
-            channels=settings.CHANNELS,
-            rate=settings.RATE,
-            input=True,
-            frames_per_buffer=settings.CHUNK,
+    def __init__(self, source=None, entrance=None, detector=None, switch_bot=None):
+        """Constructor of AutoUnlockApp
+
+        Args:
+            source (AudioSource, optional): Audio input. (default: live PyAudio input)
+            entrance (EntranceInfo, optional): Entrance to watch. \
+                (default: any channel, `UNLOCK_BOT_ID` and `AUTO_UNLOCK_API_URL`)
+            detector (Detector, optional): Detector shared by the entrances of `source`. \
+                (default: a new one)
+            switch_bot (SwitchBot, optional): Shared SwitchBot client. (default: created on start)
+        """
+        self.entrance = entrance or EntranceInfo(
+            "",
+            unlock_bot_id=settings.UNLOCK_BOT_ID,
+            api_url=settings.AUTO_UNLOCK_API_URL,
         )
-        self.chunk = settings.CHUNK
-        self.threshold = settings.THRESHOLD
-        self.consecutive_frames_threshold = settings.CONSECUTIVE_FRAMES_THRESHOLD
-        self.interval_frames_threshold = settings.INTERVAL_FRAMES_THRESHOLD
-        self.unlock_bot_id = settings.UNLOCK_BOT_ID
+        self.name = self.entrance.name
+        self.tag = f" entrance: {self.name}" if self.name else ""  # log suffix
+        self.channel = self.entrance.channel
+        logger.info(f"Initialize AutoUnlockApp.{self.tag}")
+        self.source = source or PyAudioSource(
+            settings.RATE,
+            settings.CHUNK,
+            settings.CHANNELS,
+            capture_mode=settings.CAPTURE_MODE,
+            ring_buffer_chunks=settings.RING_BUFFER_CHUNKS,
+            device=self.entrance.device,
+            stall_timeout=settings.AUDIO_STALL_TIMEOUT_MS / 1000,
+        )
+        self.chunk = self.source.chunk
+        self.samples = np.zeros(self.chunk * self.source.channels, dtype=np.int16)
+        self.front_end = self._create_front_end()
+        self.detector = detector or self._create_detector()
+        self.config = None
+        self.configure(settings.DETECTION)
+        self.next_config = self.config  # set by the manager on a reload
+        self.unlock_bot_id = self.entrance.unlock_bot_id
+        self.switch_bot = switch_bot
         self.consecutive_frames = 0
-        self.interval_frames = settings.INTERVAL_FRAMES_THRESHOLD
+        self.interval_frames = self.interval_frames_threshold
+        self.active_since = 0.0  # monotonic time of the first chunk of the current ring
+        self.detected_at = 0.0
+        self.on_first_analysed = None  # called once, e.g. by the startup profile
+        labels = {"entrance": self.name} if self.name else None
+        metrics.gauge(
+            "audio_peak", "Peak amplitude of the last chunk", self._peak, labels
+        )
+        metrics.gauge("audio_rms", "RMS level of the last chunk", self._rms, labels)
+
+    def _peak(self):
+        return self.detector.peak
+
+    def _rms(self):
+        return self.detector.rms
 
     def __call__(self):
         logger.info("Start recording...")
-        switch_bot = SwitchBot()
+        self.start()
 
-        while self.stream.is_active():
+        while self.source.is_active():
             try:
-                data = self.stream.read(self.chunk)
-                x = np.frombuffer(data, dtype="int16") / 32768.0
-                if (
-                    (x.max() > self.threshold)
-                    and (self.consecutive_frames >= self.consecutive_frames_threshold)
-                    and (self.interval_frames >= self.interval_frames_threshold)
-                ):
-                    logger.info("Unlock event detected.")
-                    switch_bot.control_device(self.unlock_bot_id, "turnOn")
-                    self.consecutive_frames = 0
-                    self.interval_frames = 0
-                elif x.max() > self.threshold:
-                    self.consecutive_frames += 1
-                else:
-                    self.consecutive_frames = 0
-                self.interval_frames += 1
+                self.react(self.detect())
             except KeyboardInterrupt:
                 logger.warning("KeyboardInterrupt.")
                 slack.post_text(
@@ -59,14 +100,241 @@ class AutoUnlockApp:
                 slack.post_text(
                     channel=settings.SLACK_CHANNEL, text=logger.get_log_message()
                 )
-                raise Exception
-            finally:
-                logger.info("Stop recording...")
+                raise e
 
         logger.info("Stop recording...")
 
+    def start(self):
+        if self.switch_bot is None:
+            self.switch_bot = SwitchBot()
+        self.switch_bot.warm_up(wait=False)
+
+    def react(self, is_event):
+        """Press the bot on an event; prepare the command when a ring starts
+
+        Args:
+            is_event (bool): Whether an event call fired on the last chunk.
+        """
+        if is_event:
+            self.unlock()
+        elif self.consecutive_frames == 1:
+            # a ring has just started: sign the command and reconnect if the idle
+            # connection was dropped, so that the press is a single request
+            self.switch_bot.prepare(self.unlock_bot_id, "turnOn", wait=False)
+
+    def unlock(self):
+        logger.info(f"Unlock event detected.{self.tag}")
+        unlocks_total.inc()
+        trace = self.start_trace("unlock")
+        with trace.span("control_device"):
+            response = self.switch_bot.control_device(self.unlock_bot_id, "turnOn")
+        trace.finish(message=response.get("message"))
+
+    def _create_front_end(self):
+        """Create the decimator in front of the detector, if `DETECTION_DECIMATION` > 1
+
+        Returns:
+            Decimator | None: Front-end filter
+        """
+        if settings.DETECTION_DECIMATION <= 1:
+            return None
+        logger.info(f"Create front-end. decimation: {settings.DETECTION_DECIMATION}")
+        return Decimator(
+            self.chunk, self.source.channels, settings.DETECTION_DECIMATION
+        )
+
+    def detection_samples(self, samples):
+        """Samples of a chunk as the detector sees them (decimated by the front-end)"""
+        if self.front_end is None:
+            return samples
+        return self.front_end(samples)
+
+    def _create_detector(self):
+        """Create the trigger strategy selected by `AUDIO_DETECTOR`
+
+        Returns:
+            Detector: Per-chunk trigger
+        """
+        logger.info(f"Create detector. detector: {settings.DETECTOR}")
+        chunk, rate = self.chunk, self.source.rate
+        if self.front_end is not None:
+            chunk, rate = self.front_end.chunk, rate / self.front_end.factor
+        if settings.DETECTOR == "goertzel":
+            return GoertzelDetector(
+                chunk,
+                self.source.channels,
+                rate,
+                settings.CHIME_FREQUENCIES,
+                settings.CHIME_POWER_RATIO,
+                settings.CHIME_MIN_LEVEL,
+            )
+        if settings.DETECTOR == "adaptive":
+            state_file = settings.NOISE_FLOOR_STATE_FILE
+            if state_file and self.entrance.device is not None:
+                # one noise floor per microphone
+                root, ext = os.path.splitext(state_file)
+                state_file = f"{root}.{self.entrance.device}{ext}"
+            detector = AdaptiveDetector(
+                chunk,
+                self.source.channels,
+                rate,
+                settings.NOISE_MARGIN_DB,
+                settings.NOISE_FLOOR_TIME_SEC,
+                settings.NOISE_MIN_LEVEL,
+                state_file=state_file,
+            )
+            metrics.gauge(
+                "audio_noise_floor_db",
+                "Estimated noise floor in dB of int16 RMS",
+                lambda: 0.0 if detector.floor_db is None else detector.floor_db.max(),
+                (
+                    None
+                    if self.entrance.device is None
+                    else {"device": self.entrance.device}
+                ),
+            )
+            return detector
+        return PeakDetector(chunk, self.source.channels, settings.THRESHOLD)
+
+    def read_chunk_into(self, out):
+        """Read one chunk of audio into a preallocated int16 array
+
+        Args:
+            out (numpy.ndarray): int16 array of `chunk * channels` samples.
+
+        Returns:
+            numpy.ndarray: `out`
+        """
+        return self.source.read_into(out)
+
+    def fetch_audio_data(self):
+        return self.read_chunk_into(self.samples)
+
+    def is_event_call(self, is_active):
+        return (
+            is_active
+            and (self.consecutive_frames >= self.consecutive_frames_threshold)
+            and (self.interval_frames >= self.interval_frames_threshold)
+        )
+
+    def start_trace(self, kind):
+        """Start the trace of the event detected last
+
+        Args:
+            kind (str): Event kind.
+
+        Returns:
+            Trace: Trace holding the `detection` span, from the first active chunk to the trigger.
+        """
+        trace = tracer.start(kind)
+        if self.name:
+            trace.attrs["entrance"] = self.name
+        trace.add(
+            "detection", min(self.active_since, self.detected_at), self.detected_at
+        )
+        return trace
+
+    def track_activity(self, is_active, now):
+        if is_active and not self.consecutive_frames:
+            self.active_since = now
+
+    def channel_active(self):
+        """Whether the last analysed chunk is active on the entrance's channel"""
+        if self.channel is None:
+            return bool(self.detector.active.any())
+        return bool(self.detector.active[self.channel])
+
+    def analyse(self):
+        """Read one chunk and run the detector on all of its channels
+
+        Returns:
+            float: `time.monotonic()` at the analysis.
+        """
+        samples = self.fetch_audio_data()
+        t = time.perf_counter()
+        now = time.monotonic()
+        self.detector(self.detection_samples(samples))
+        chunks_total.inc()
+        chunk_latency.observe(time.perf_counter() - t)
+        self.mark_analysed()
+        return now
+
+    def mark_analysed(self):
+        """Call `on_first_analysed` after the first analysed chunk, then drop it"""
+        if self.on_first_analysed is not None:
+            callback, self.on_first_analysed = self.on_first_analysed, None
+            callback()
+
+    def detect(self):
+        """Read one chunk and advance the trigger state machine
+
+        Returns:
+            bool: True if an event call fires on this chunk.
+        """
+        return self.step(self.analyse())
+
+    def step(self, now):
+        """Advance the trigger state machine with the last analysed chunk
+
+        Args:
+            now (float): `time.monotonic()` at the analysis.
+
+        Returns:
+            bool: True if an event call fires on this chunk.
+        """
+        self.reload()
+        is_active = self.channel_active()
+        self.track_activity(is_active, now)
+        is_event = self.is_event_call(is_active)
+        if is_event:
+            events_total.inc()
+            self.detected_at = now
+            self.consecutive_frames = 0
+            self.interval_frames = 0
+        elif is_active:
+            self.consecutive_frames += 1
+        else:
+            self.consecutive_frames = 0
+        self.interval_frames += 1
+        return is_event
+
+    def reload(self):
+        """Apply the parameters the manager has set in `next_config`, if any
+
+        Called between two chunks, so no chunk is judged with half of the change.
+        """
+        if self.next_config is not self.config:
+            self.configure(self.next_config)
+
+    def configure(self, config):
+        """Apply detection parameters and recompute the thresholds in chunks
+
+        Args:
+            config (DetectionConfig): Detection parameters.
+        """
+        chunks_per_sec = self.source.rate / self.chunk
+        # whole seconds: a 0.5 s threshold triggers on the first active chunk
+        self.consecutive_frames_threshold = int(config.consecutive_sec) * chunks_per_sec
+        self.interval_frames_threshold = int(config.interval_sec) * chunks_per_sec
+        if isinstance(self.detector, PeakDetector):
+            self.detector.threshold = to_int16_threshold(config.threshold)
+        elif self.config is not None and config.threshold != self.config.threshold:
+            logger.warning(
+                "AUDIO_THRESHOLD not applied: only the peak detector without "
+                f"ANALYSIS_WORKERS reloads it.{self.tag}"
+            )
+        self.config = config
+
+    def recover(self):
+        """Get ready to run again after an error (called by the manager)
+
+        Only a failed or stalled audio stream is re-opened; the SwitchBot
+        client and its connections are kept.
+        """
+        if self.source.recover():
+            logger.info(f"Audio stream re-opened.{self.tag}")
+
     def _cleanup(self):
-        self.stream.stop_stream()
-        self.stream.close()
-        self.audio.terminate()
+        self.detector.close()
+        self.source.close()
         logger.info("Stop AutoUnlockApp.")
@@ -4,130 +4,763 @@ import asyncio
 import json
 import os
 import time
-import wave
-
-import numpy as np
-import requests
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from urllib.parse import urlsplit
 
+from app.src.audio import (
+    AnalysisOffload,
+    AudioBus,
+    AudioEncoder,
+    Clip,
+    Endpointer,
+    encode_wav,
+    iter_multipart_wav,
+)
 from app.src.auto_unlock import AutoUnlockApp
-from app.utils import logger, settings, slack
+from app.src.auto_unlock.auto_unlock_app import (
+    chunk_latency,
+    chunks_total,
+    events_total,
+    unlocks_total,
+)
+from app.utils import logger, metrics, settings, slack
+
+api_latency = metrics.histogram(
+    "auto_unlock_api_seconds", "Auto Unlock API round-trip time"
+)
+offload_latency = metrics.histogram(
+    "analysis_offload_seconds", "Time from submitting a batch to its analysis result"
+)
+offload_dropped = metrics.counter(
+    "analysis_dropped_chunks_total",
+    "Chunks not analysed because the pool was busy or they were overwritten",
+)
+recording_seconds = metrics.histogram(
+    "auto_unlock_recording_seconds",
+    "Duration of uploaded passphrase clips",
+    (0.5, 1, 1.5, 2, 3, 4, 5, 7.5, 10),
+)
+upload_bytes = metrics.counter(
+    "auto_unlock_upload_bytes_total", "Encoded audio uploaded to the Auto Unlock API"
+)
+api_errors = metrics.counter(
+    "auto_unlock_api_errors_total", "Failed Auto Unlock API calls"
+)
 
 
 class AutoUnlockAppWAuth(AutoUnlockApp):
-    def __init__(self):
+    warm_up_interval = 10.0  # seconds after an API request with no warm-up
+    warm_up_read_timeout = 1.0  # seconds; the warm-up only has to connect
+
+    def __init__(self, source=None, entrance=None, detector=None):
+        """Constructor of AutoUnlockAppWAuth
+
+        Args:
+            source (AudioSource, optional): Audio input. (default: live PyAudio input)
+            entrance (EntranceInfo, optional): Entrance to watch. (default: see `AutoUnlockApp`)
+            detector (Detector, optional): Detector shared by the entrances of `source`. \
+                (default: a new one)
+        """
         logger.info("Initialize AutoUnlockAppWAuth.")
-        super(AutoUnlockAppWAuth, self).__init__()
+        super(AutoUnlockAppWAuth, self).__init__(source, entrance, detector)
 
-        self.auto_unlock_api_url = settings.AUTO_UNLOCK_API_URL
+        self.auto_unlock_api_url = self.entrance.api_url
+        url = urlsplit(self.auto_unlock_api_url or "")
+        self.api_host = (
+            f"{url.scheme}://{url.netloc}"  # entrances on it share a session
+        )
+        self.session = (
+            None  # pooled HTTP session of the API host, set by `run_pipeline`
+        )
+        self.last_request_at = 0.0  # monotonic time of the last API request
+        self.warm_ups = None  # executor of the warm-ups, set by `run_pipeline`
+        self._warm_up = None  # the warm-up in flight
 
-        self.rate = settings.RATE
-        self.format = settings.FORMAT
-        self.channels = settings.CHANNELS
-        self.duration = settings.DURATION
+        self.rate = self.source.rate
+        # an entrance bound to one channel records that channel only
+        self.channels = self.source.channels if self.channel is None else 1
+        self.pre_roll_chunks = settings.PRE_ROLL_CHUNKS
+        self.endpoint_silence_sec = settings.ENDPOINT_SILENCE_SEC  # 0: no endpointing
+        self.upload_mode = settings.UPLOAD_MODE
+        self.upload_rate = settings.UPLOAD_RATE  # 0: capture rate
+        self.upload_mono = settings.UPLOAD_MONO
+        self.upload_codec = settings.UPLOAD_CODEC
+        self.save_dir = settings.RECORDING_SAVE_DIR
+        self.timeout = (
+            settings.AUTO_UNLOCK_API_CONNECT_TIMEOUT_SEC,
+            settings.AUTO_UNLOCK_API_READ_TIMEOUT_SEC,
+        )
+        self.queue_size = settings.PIPELINE_QUEUE_SIZE
+        self.wav_data = b""
+        self.bus = None  # audio bus of `source`, set by `run_pipeline`
+        self.clip = None
+        self.position = 0  # bus position after the last analysed chunk
+        self.recorded_until = 0  # bus position where the last clip ended
+        self.is_pending = False
         self.is_phrase_authorized = False
         self.is_retry = False
 
+    def configure(self, config):
+        super(AutoUnlockAppWAuth, self).configure(config)
+        # a clip being recorded keeps its length
+        self.duration = config.duration
+        self.recording_chunks = int(self.source.rate / self.chunk * self.duration)
+
     def __call__(self):
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(self.record_loop())
+        try:
+            asyncio.run(self.record_loop())
+        except KeyboardInterrupt:
+            logger.warning("KeyboardInterrupt.")
+            slack.post_text(
+                channel=settings.SLACK_CHANNEL, text=logger.get_log_message()
+            )
+        except Exception as e:
+            slack.post_text(
+                channel=settings.SLACK_CHANNEL, text=logger.get_log_message()
+            )
+            raise e
+
+    def attach(self, bus):
+        """Start a pipeline run on `bus` with the trigger state of a fresh start
+
+        An event or clip left over from a failed run refers to the previous bus.
+
+        Args:
+            bus (AudioBus): Audio bus of `source`.
+        """
+        self.bus = bus
+        self.position = 0
+        self.recorded_until = 0
+        self.clip = None
+        self.is_pending = False
+        self.is_phrase_authorized = False
+        self.is_retry = False
 
     async def record_loop(self):
-        while self.stream.is_active():
+        """Run capture, detection, upload and notification as concurrent stages
+
+        Captured audio goes to a shared-memory bus that detection and recording
+        read through their own cursors; the other stages are connected by
+        bounded queues. Blocking reads, HTTP requests and Slack posts run in
+        executor threads, so a slow API response never stops audio from being
+        read and analyzed.
+        """
+        await run_pipeline([[self]])
+
+    async def capture_stage(self, executor):
+        """Read chunks straight into the bus slots and publish them
+
+        A live input is read as chunks arrive: a consumer that falls behind
+        (e.g. the recorder of a slow upload) skips ahead on the bus instead of
+        holding back detection. A finite source (a file) is read faster than
+        real time, so there capture waits while a consumer is `queue_size`
+        chunks behind rather than overrunning it.
+        """
+        loop = asyncio.get_running_loop()
+        report_chunks = max(int(self.rate / self.chunk), 1)
+        max_lag = min(self.queue_size, self.bus.capacity - 2)  # see `AudioBus.oldest`
+        while self.source.is_active():
+            while (
+                not self.source.is_live
+                and max(self.bus.lags().values(), default=0) >= max_lag
+            ):
+                await asyncio.sleep(self.chunk / self.rate / 4)
+            await loop.run_in_executor(
+                executor, self.read_chunk_into, self.bus.next_slot()
+            )
+            self.bus.commit()
+            self.audio_ready.set()
+            if self.bus.written % report_chunks == 0:
+                self.bus.report()
+        self.capture_done = True
+        self.audio_ready.set()
+
+    async def read_bus(self, cursor):
+        """Wait for the next chunk on the bus
+
+        Args:
+            cursor (BusCursor): The consumer's cursor.
+
+        Returns:
+            numpy.ndarray | None: View of the chunk, or None once capture has ended.
+        """
+        while (samples := cursor.read_nowait()) is None:
+            if self.capture_done:
+                return None
+            self.audio_ready.clear()
+            await self.audio_ready.wait()
+        return samples
+
+    async def detection_stage(self, apps):
+        """Analyse each chunk once and let every entrance on this source act on it
+
+        Args:
+            apps (list[AutoUnlockAppWAuth]): Entrances sharing `source` and `detector`.
+        """
+        cursor = self.bus.cursor("detector")
+        while (samples := await self.read_bus(cursor)) is not None:
+            t = time.perf_counter()
+            now = time.monotonic()
+            self.detector(self.detection_samples(samples))
+            for app in apps:
+                app.process(cursor.position, now)
+            chunks_total.inc()
+            chunk_latency.observe(time.perf_counter() - t)
+            self.mark_analysed()
+        cursor.close()
+        await self.end_stream(apps)
+
+    async def offload_stage(self, apps, offload):
+        """Analyse chunks in a process pool and act on the results in capture order
+
+        Only bus positions are handed over on the event loop; the workers
+        read the chunks from the bus's shared memory and run the detector.
+
+        Args:
+            apps (list[AutoUnlockAppWAuth]): Entrances sharing `source`.
+            offload (AnalysisOffload): Pool standing in for their detector.
+        """
+        batches = asyncio.Queue()
+        cursor = self.bus.cursor("detector")
+
+        async def submit():
+            batch = []
+            while await self.read_bus(cursor) is not None:
+                batch.append((cursor.position, time.monotonic()))
+                if len(batch) == offload.batch_chunks:
+                    await batches.put(self._submit(offload, batch))
+                    batch = []
+            if batch:
+                await batches.put(self._submit(offload, batch))
+            await batches.put(None)
+
+        submit_task = asyncio.create_task(submit())
+        try:
+            while (job := await batches.get()) is not None:
+                future, batch, submitted_at = job
+                result = None
+                if future is not None:
+                    result = await asyncio.wrap_future(future)
+                    offload_latency.observe(time.monotonic() - submitted_at)
+                self._process_batch(apps, offload, result, batch)
+            await submit_task
+        finally:
+            submit_task.cancel()
+            cursor.close()
+        await self.end_stream(apps)
+
+    def _submit(self, offload, batch):
+        # the chunk read at `position` is the one before it on the bus
+        future = offload.submit([position - 1 for position, _ in batch])
+        return future, batch, time.monotonic()
+
+    def _process_batch(self, apps, offload, result, batch):
+        for i, (position, now) in enumerate(batch):
+            if not offload.load(result, i):
+                offload_dropped.inc()
+            for app in apps:
+                app.process(position, now)
+            chunks_total.inc()
+            self.mark_analysed()
+
+    async def end_stream(self, apps):
+        for app in apps:
+            if app.clip is not None:
+                app.clip.close()
+            await app.upload_queue.put(None)
+
+    def process(self, position, now):
+        """Advance the trigger state machine with one analysed chunk
+
+        Args:
+            position (int): Bus position after the chunk.
+            now (float): `time.monotonic()` at the analysis.
+        """
+        self.reload()
+        self.position = position
+        if self.clip is not None and self.clip.poll():
+            self.recorded_until = self.clip.end
+            self.clip = None
+
+        is_active = self.channel_active()
+        self.track_activity(is_active, now)
+        if not self.is_pending and self.is_unlock_event(is_active):
+            logger.info(f"Unlock event detected.{self.tag}")
+            unlocks_total.inc()
+            self.detected_at = now
+            self.dispatch(is_file=True)
+        elif not self.is_pending and self.is_event_call(is_active):
+            events_total.inc()
+            self.detected_at = now
+            self.dispatch()
+        elif is_active:
+            self.consecutive_frames += 1
+            if self.consecutive_frames == 1:
+                self.request_warm_up(now)
+        else:
+            self.consecutive_frames = 0
+        self.interval_frames += 1
+
+    def request_warm_up(self, now):
+        """Reconnect to the API on the warm-up thread while the visitor speaks
+
+        Called when a ring starts, as the connection may have idled out since
+        the last request. The warm-up runs beside the upload stage, so an
+        event never waits for it. Nothing is started while an event is under
+        way or a warm-up is in flight, or if the last request was less than
+        `warm_up_interval` seconds ago.
+
+        Args:
+            now (float): `time.monotonic()` at the analysis.
+        """
+        if self.is_pending or self.warm_ups is None:
+            return
+        if self._warm_up is not None and not self._warm_up.done():
+            return
+        if now - self.last_request_at < self.warm_up_interval:
+            return
+        self.last_request_at = now
+        self._warm_up = self.warm_ups.submit(self.warm_up)
+
+    async def upload_stage(self, executor):
+        loop = asyncio.get_running_loop()
+        while (job := await self.upload_queue.get()) is not None:
+            is_file, clip, trace, dispatched_at = job
+            trace.add("queue", dispatched_at)
             try:
-                x = self.fetch_audio_data()
-                if self.is_unlock_event(x):
-                    logger.info("Unlock event detected.")
-                    await self.recording()
-                    await self.event(is_file=True)
-                elif self.is_event_call(x):
-                    await self.event()
-                elif x.max() > self.threshold:
-                    self.consecutive_frames += 1
-                else:
-                    self.consecutive_frames = 0
-                self.interval_frames += 1
-            except KeyboardInterrupt:
-                logger.warning("KeyboardInterrupt.")
-                slack.post_text(
-                    channel=settings.SLACK_CHANNEL, text=logger.get_log_message()
+                with trace.span("post_api"):
+                    response = await loop.run_in_executor(
+                        executor, self.post_api, is_file, clip
+                    )
+            except Exception:
+                api_errors.inc()
+                raise
+            finally:
+                # a failed upload must not block the next event after a restart
+                self.is_pending = False
+                self.last_request_at = time.monotonic()
+            if clip is not None and clip.completed_at is not None:
+                trace.add("recording", clip.started_at, clip.completed_at)
+            with trace.span("decision"):
+                message = self.event(response, is_file)
+            trace.attrs["phrase_authorized"] = bool(response["phrase_authorized"])
+            self.notify(message, trace)
+
+    async def notification_stage(self, executor):
+        loop = asyncio.get_running_loop()
+        while (job := await self.notify_queue.get()) is not None:
+            text, trace = job
+            start = time.monotonic()
+            try:
+                await loop.run_in_executor(
+                    executor,
+                    partial(slack.post_text, channel=settings.SLACK_CHANNEL, text=text),
                 )
-                break
             except Exception as e:
-                slack.post_text(
-                    channel=settings.SLACK_CHANNEL, text=logger.get_log_message()
-                )
-                raise e
-
-    def fetch_audio_data(self):
-        data = self.stream.read(self.chunk)
-        x = np.frombuffer(data, dtype="int16") / 32768.0
-        return x
-
-    def is_event_call(self, x):
-        return (
-            (x.max() > self.threshold)
-            and (self.consecutive_frames >= self.consecutive_frames_threshold)
-            and (self.interval_frames >= self.interval_frames_threshold)
+                logger.error(e)
+            if trace is not None:
+                trace.add("notify", start)
+                trace.finish()
+
+    def dispatch(self, is_file=False):
+        """Hand an event over to the upload stage
+
+        Args:
+            is_file (bool, optional): Record a passphrase clip and upload it. (default: `False`)
+        """
+        logger.info(f"Event detected. is_file: {is_file}{self.tag}")
+        self.is_pending = True
+        trace = self.start_trace("unlock" if is_file else "call")
+        clip = None
+        if is_file:
+            logger.info("Start recording.")
+            # the pre-roll is still on the bus, unless the last clip used it
+            start = max(self.position - self.pre_roll_chunks, self.recorded_until)
+            clip = Clip(
+                self.bus,
+                start,
+                self.position + self.recording_chunks,
+                self.channel,
+                self.create_endpointer(),
+                self.position - start,
+            )
+            self.clip = clip
+        self.upload_queue.put_nowait((is_file, clip, trace, time.monotonic()))
+
+    def create_endpointer(self):
+        """Endpointer of a new clip, or None if endpointing is disabled"""
+        if self.endpoint_silence_sec <= 0:
+            return None
+        return Endpointer(
+            self.chunk,
+            self.channels,
+            self.rate,
+            self.endpoint_silence_sec,
+            settings.ENDPOINT_MIN_SEC,
+            settings.ENDPOINT_PAD_SEC,
+            settings.ENDPOINT_MARGIN_DB,
+            settings.ENDPOINT_MIN_LEVEL,
         )
 
-    def is_unlock_event(self, x):
-        return (
-            (x.max() > self.threshold) or self.is_retry
-        ) and self.is_phrase_authorized
+    def notify(self, text, trace=None):
+        """Hand a message over to the notification stage
+
+        Args:
+            text (str): Message text
+            trace (Trace, optional): Event trace, finished once the message is posted.
+        """
+        try:
+            self.notify_queue.put_nowait((text, trace))
+        except asyncio.QueueFull:
+            logger.warning("Notification queue is full. Drop a message.")
+            if trace is not None:
+                trace.finish()
+
+    def is_unlock_event(self, is_active):
+        return (is_active or self.is_retry) and self.is_phrase_authorized
+
+    def warm_up(self):
+        """Open the pooled connection to the Auto Unlock API ahead of the next request"""
+        try:
+            self.session.head(
+                self.auto_unlock_api_url,
+                timeout=(self.timeout[0], self.warm_up_read_timeout),
+            )
+            logger.debug(f"Auto Unlock API connection warmed up.{self.tag}")
+        except OSError as e:  # requests.RequestException is an OSError
+            logger.warning(f"Auto Unlock API warm up failed: {e}{self.tag}")
+
+    def post_api(self, is_file=False, clip=None):
+        """Call the Auto Unlock API (blocking; runs in an executor thread)
+
+        Args:
+            is_file (bool, optional): Upload `clip` as a WAV file. (default: `False`)
+            clip (Clip, optional): Passphrase clip being recorded.
 
-    def post_api(self, is_file=False):
+        Returns:
+            dict: API response
+        """
+        # in streaming mode this includes the recording the upload overlaps with
+        with api_latency.time():
+            response = self._post(is_file, clip)
+        return json.loads(response.text)
+
+    def _post(self, is_file, clip):
         if not is_file:
-            response = requests.post(self.auto_unlock_api_url)
+            response = self.session.post(self.auto_unlock_api_url, timeout=self.timeout)
+        elif self.upload_mode == "streaming":
+            boundary = uuid.uuid4().hex
+            response = self.session.post(
+                self.auto_unlock_api_url,
+                data=self.stream_recording(boundary, clip),
+                headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+                timeout=self.timeout,
+            )
         else:
-            files = {"file": ("test.wav", open("out/record.wav", "rb"), "audio/wav")}
-            response = requests.post(self.auto_unlock_api_url, files=files)
+            encoder = self.recording(clip)
+            files = {"file": ("test.wav", self.wav_data, encoder.content_type)}
+            response = self.session.post(
+                self.auto_unlock_api_url,
+                files=files,
+                data=self.format_fields(encoder),
+                timeout=self.timeout,
+            )
+        return response
 
-        return json.loads(response.text)
+    def create_encoder(self):
+        """Encoder of a new clip, to the upload rate, channels and codec"""
+        return AudioEncoder(
+            self.rate,
+            self.channels,
+            self.upload_rate,
+            self.upload_mono,
+            self.upload_codec,
+        )
+
+    def format_fields(self, encoder):
+        """Form fields declaring the upload format (none for the capture format)"""
+        if encoder.is_identity:
+            return {}
+        return {"format": encoder.description}
 
-    async def event(self, is_file=False):
-        logger.info(f"Event detected. is_file: {is_file}")
-        response = self.post_api(is_file)
+    def event(self, response, is_file=False):
+        """Apply an Auto Unlock API response to the trigger state
 
+        Args:
+            response (dict): API response
+            is_file (bool, optional): Whether a clip was uploaded. (default: `False`)
+
+        Returns:
+            str: Outcome message
+        """
         if response["phrase_authorized"]:
             self.is_phrase_authorized = True
             self.is_retry = is_file
-            logger.info("Auto Unlock API response: Success Call available.")
+            message = "Auto Unlock API response: Success Call available."
         else:
             self.is_phrase_authorized = False
             self.is_retry = False
             self.consecutive_frames = 0
             self.interval_frames = 0
-            logger.info("Auto Unlock API response: Success Auto Unlock.")
+            message = "Auto Unlock API response: Success Auto Unlock."
+        message += self.tag
+        logger.info(message)
+        return message
 
-    async def recording(self):
+    def recording(self, clip):
         """
-        Records audio for a given duration and saves it as a WAV file.
+        Waits for a clip to complete and encodes it as an in-memory WAV (`self.wav_data`).
+
+        The clip starts with the pre-roll window (audio captured just before the
+        trigger) followed by up to `duration` seconds of post-trigger audio. With
+        endpointing, it ends after the speech and its silence is trimmed.
 
-        Parameters:
-        duration (int): The duration of the recording in seconds. Default is 2 seconds.
-        output_filename (str): The name of the output WAV file. Default is 'test.wav'.
+        Args:
+            clip (Clip): Passphrase clip being recorded.
+
+        Returns:
+            AudioEncoder: Encoder of the clip, which tells its format.
         """
-        logger.info("Start recording to file.")
+        encoder = self.create_encoder()
+        frames = [encoder(frame) for frame in clip]
+        self.wav_data = encode_wav(
+            frames,
+            encoder.channels,
+            encoder.rate,
+            encoder.sample_width,
+            encoder.format_tag,
+        )
+        if self.save_dir:
+            self.save_recording()
+        self.end_recording(clip, sum(len(frame) for frame in frames))
+        return encoder
+
+    def stream_recording(self, boundary, clip):
+        """Record while uploading: a chunked multipart body for `requests.post`
+
+        Each chunk is sent as soon as the capture stage publishes it, so the
+        upload overlaps with the capture instead of following it. The WAV
+        header declares the full clip, so a clip that ends early or misses
+        chunks is padded with silence. With endpointing, the length is known
+        only once the clip has ended: the clip (at most `duration` seconds) is
+        held back until then and sent with its trimmed length.
+
+        Args:
+            boundary (str): Multipart boundary.
+            clip (Clip): Passphrase clip being recorded.
+
+        Yields:
+            bytes: Body parts
+        """
+        encoder = self.create_encoder()
         frames = []
+        sizes = []
+
+        def capture():
+            for frame in clip:
+                frame = encoder(frame)
+                if self.save_dir:
+                    frames.append(frame)
+                sizes.append(len(frame))
+                yield frame
+
+        def padded(data_size):
+            yield from capture()
+            if (missing := data_size - sum(sizes)) > 0:
+                logger.warning(f"Pad the streamed recording. silence: {missing} bytes")
+                frame = encoder.silence(missing)
+                if self.save_dir:
+                    frames.append(frame)
+                sizes.append(missing)
+                yield frame
 
-        # 録音
-        for _ in range(0, int(self.rate / self.chunk * self.duration)):
-            data = self.stream.read(self.chunk)
-            frames.append(data)
-            time.sleep(self.chunk / self.rate)  # 適切な遅延を追加
+        if clip.endpointer is None:
+            data_size = encoder.data_size(clip.n_chunks * self.chunk)
+            body = padded(data_size)
+        else:
+            body = list(capture())
+            data_size = sum(sizes)
+        yield from iter_multipart_wav(
+            body,
+            data_size,
+            encoder.channels,
+            encoder.rate,
+            boundary,
+            sample_width=encoder.sample_width,
+            format_tag=encoder.format_tag,
+            content_type=encoder.content_type,
+            fields=self.format_fields(encoder),
+        )
+        size = sum(sizes)
+        if self.save_dir:
+            self.wav_data = encode_wav(
+                frames,
+                encoder.channels,
+                encoder.rate,
+                encoder.sample_width,
+                encoder.format_tag,
+            )
+            self.save_recording()
+        self.end_recording(clip, size)
 
-        # 録音データをwaveファイルに保存
-        output_dir = "./out"
-        os.makedirs(output_dir, exist_ok=True)
-        wf = wave.open(os.path.join(output_dir, "record.wav"), "wb")
-        wf.setnchannels(self.channels)
-        wf.setsampwidth(self.audio.get_sample_size(self.format))
-        wf.setframerate(self.rate)
-        wf.writeframes(b"".join(frames))
-        wf.close()
+    def end_recording(self, clip, size):
+        seconds = clip.length * self.chunk / self.rate
+        recording_seconds.observe(seconds)
+        upload_bytes.inc(size)
+        message = f"End recording. duration: {seconds:.2f} s, size: {size} bytes"
+        if clip.endpointer is not None:
+            trimmed = clip.endpointer.trimmed * self.chunk / self.rate
+            message += f", silence trimmed: {trimmed:.2f} s"
+        logger.info(message)
 
-        logger.info("End recording to file.")
+    def save_recording(self):
+        """Save the last recording under `save_dir` with a unique file name"""
+        os.makedirs(self.save_dir, exist_ok=True)
+        filename = datetime.now().strftime("record_%Y%m%d_%H%M%S_%f.wav")
+        with open(os.path.join(self.save_dir, filename), "wb") as f:
+            f.write(self.wav_data)
 
     def _cleanup(self):
         super(AutoUnlockAppWAuth, self)._cleanup()
         logger.info("Stop AutoUnlockAppWAuth.")
+
+
+def _create_session(pool_maxsize):
+    import requests  # loaded off the startup path (see AutoUnlockAppManager)
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+async def _share_sessions(apps, loop, executor):
+    """Give the entrances one pooled keep-alive session per API host
+
+    Sessions are kept across restarts. Each pool holds a connection for each
+    entrance on the host, plus one for the warm-up thread.
+    """
+    sessions = {}
+    for app in apps:
+        if app.session is not None:
+            sessions.setdefault(app.api_host, app.session)
+    for app in apps:
+        if app.api_host not in sessions:
+            users = sum(other.api_host == app.api_host for other in apps)
+            sessions[app.api_host] = await loop.run_in_executor(
+                executor, _create_session, users + 1
+            )
+        app.session = sessions[app.api_host]
+
+
+async def run_pipeline(groups):
+    """Run the stages of every entrance on one event loop
+
+    Each source gets a capture and a detection stage that analyses a chunk once
+    for all of its entrances (in a process pool if `ANALYSIS_WORKERS` > 0). Each
+    entrance gets its own upload stage and auth state. Entrances calling the
+    same API host share one pooled keep-alive HTTP session, which their upload
+    stages and the warm-up thread use. The notification stage, the warm-up
+    thread and the I/O threads are shared.
+
+    Args:
+        groups (list[list[AutoUnlockAppWAuth]]): Entrances grouped by source, \
+            the first of each group reading the source.
+    """
+    apps = [app for group in groups for app in group]
+    queue_size = apps[0].queue_size
+    notify_queue = asyncio.Queue(queue_size)
+    buses = []
+    for group in groups:
+        lead = group[0]
+        bus = AudioBus(lead.chunk, lead.source.channels, settings.AUDIO_BUS_CHUNKS)
+        buses.append(bus)
+        lead.audio_ready = asyncio.Event()
+        lead.capture_done = False
+        for app in group:
+            app.attach(bus)
+    for app in apps:
+        app.upload_queue = asyncio.Queue(1)
+        app.notify_queue = notify_queue
+    metrics.gauge(
+        "audio_bus_lag_chunks",
+        "Chunks the slowest audio bus consumer has still to read",
+        lambda: max((max(bus.lags().values(), default=0) for bus in buses), default=0),
+    )
+    metrics.gauge(
+        "audio_bus_missed_chunks",
+        "Chunks skipped by audio bus consumers that fell a full ring behind",
+        lambda: sum(bus.missed for bus in buses),
+    )
+    metrics.gauge(
+        "auto_unlock_notify_queue",
+        "Messages waiting for the notification stage",
+        notify_queue.qsize,
+    )
+    capture_executors = [
+        ThreadPoolExecutor(1, thread_name_prefix="capture") for _ in groups
+    ]
+    io_executor = ThreadPoolExecutor(len(apps) + 1, thread_name_prefix="io")
+    warm_ups = ThreadPoolExecutor(1, thread_name_prefix="warm-up")
+    loop = asyncio.get_running_loop()
+    offloads = []
+
+    tasks = []
+    try:
+        for group, executor in zip(groups, capture_executors):
+            lead = group[0]
+            tasks.append(asyncio.create_task(lead.capture_stage(executor)))
+            if settings.ANALYSIS_WORKERS > 0:
+                offload = AnalysisOffload(
+                    lead.bus,
+                    lead.detector,
+                    settings.ANALYSIS_BATCH_CHUNKS,
+                    settings.ANALYSIS_SLOTS,
+                    settings.ANALYSIS_WORKERS,
+                    front_end=lead.front_end,
+                )
+                offloads.append((offload, group))
+                await loop.run_in_executor(io_executor, offload.start)
+                for app in group:
+                    app.detector = offload
+                stage = lead.offload_stage(group, offload)
+            else:
+                stage = lead.detection_stage(group)
+            tasks.append(asyncio.create_task(stage))
+
+        await _share_sessions(apps, loop, io_executor)
+        for app in apps:
+            app.warm_ups = warm_ups
+        uploads = [asyncio.create_task(app.upload_stage(io_executor)) for app in apps]
+        tasks += uploads
+        tasks.append(asyncio.create_task(apps[0].notification_stage(io_executor)))
+
+        async def close_notifications():
+            await asyncio.gather(*uploads)
+            await notify_queue.put(None)
+
+        tasks.append(asyncio.create_task(close_notifications()))
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for app in apps:
+            if app.clip is not None:
+                app.clip.close()
+                app.clip = None  # its bus is closed below
+        for executor in capture_executors:
+            # a read still pending must end before `recover` touches the stream
+            executor.shutdown(wait=True, cancel_futures=True)
+        io_executor.shutdown(wait=False, cancel_futures=True)
+        warm_ups.shutdown(wait=False, cancel_futures=True)
+        for offload, group in offloads:
+            detector = offload.close()
+            for app in group:
+                app.detector = detector
+        for bus in buses:
+            bus.close()
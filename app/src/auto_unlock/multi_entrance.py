@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+import asyncio
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from app.src.auto_unlock.auto_unlock_app import AutoUnlockApp
+from app.src.auto_unlock.auto_unlock_app_w_auth import AutoUnlockAppWAuth, run_pipeline
+from app.src.switch_bot.switch_bot import SwitchBot
+from app.utils import logger, settings, slack
+
+
+class MultiEntranceApp:
+    def __init__(self, entrances, is_authenticating=True):
+        """Several entrances watched by one process
+
+        Entrances on the same device share one audio stream and one detector,
+        which analyses all channels of a chunk at once. Each entrance keeps
+        its own trigger state, SwitchBot ID and Auto Unlock API auth state;
+        the SwitchBot client, the Slack notifier and one pooled HTTP session
+        per Auto Unlock API host (see `run_pipeline`) are shared.
+
+        Args:
+            entrances (list[EntranceInfo]): Entrances to watch.
+            is_authenticating (bool, optional): Use the Auto Unlock API. (default: `True`)
+        """
+        logger.info(f"Initialize MultiEntranceApp. entrances: {len(entrances)}")
+        self.is_authenticating = is_authenticating
+        app_class = AutoUnlockAppWAuth if is_authenticating else AutoUnlockApp
+
+        devices = {}
+        for entrance in entrances:
+            devices.setdefault(entrance.device, []).append(entrance)
+        self.groups = []
+        for device_entrances in devices.values():
+            lead = app_class(entrance=device_entrances[0])
+            self.groups.append(
+                [lead]
+                + [
+                    app_class(lead.source, entrance, lead.detector)
+                    for entrance in device_entrances[1:]
+                ]
+            )
+        self.apps = [app for group in self.groups for app in group]
+        self.stopped = threading.Event()
+        self.switch_bot = None
+
+    def __call__(self):
+        try:
+            if self.is_authenticating:
+                asyncio.run(run_pipeline(self.groups))
+            else:
+                self._watch_all()
+        except KeyboardInterrupt:
+            logger.warning("KeyboardInterrupt.")
+            slack.post_text(
+                channel=settings.SLACK_CHANNEL, text=logger.get_log_message()
+            )
+        except Exception as e:
+            logger.warning(str(e))
+            slack.post_text(
+                channel=settings.SLACK_CHANNEL, text=logger.get_log_message()
+            )
+            raise e
+
+    def _watch_all(self):
+        """Watch each device on its own thread, pressing bots through one client"""
+        if self.switch_bot is None:  # kept across restarts
+            self.switch_bot = SwitchBot(pool_maxsize=len(self.apps) + 1)
+            for app in self.apps:
+                app.switch_bot = self.switch_bot
+        self.switch_bot.warm_up(wait=False)
+
+        self.stopped.clear()
+        executor = ThreadPoolExecutor(len(self.groups), thread_name_prefix="device")
+        try:
+            futures = [executor.submit(self._watch, group) for group in self.groups]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+        finally:
+            self.stopped.set()
+            executor.shutdown(wait=True)
+
+    def _watch(self, group):
+        lead = group[0]
+        while lead.source.is_active() and not self.stopped.is_set():
+            now = lead.analyse()
+            for app in group:
+                app.react(app.step(now))
+
+    def recover(self):
+        """Re-open the failed or stalled audio streams (called by the manager)"""
+        for group in self.groups:
+            group[0].recover()
+
+    def _cleanup(self):
+        for group in self.groups:
+            group[0]._cleanup()
+        logger.info("Stop MultiEntranceApp.")
@@ -0,0 +1,86 @@
+import os
+import threading
+
+import dotenv
+
+from app.utils import DetectionConfig, logger
+
+
+class ConfigWatcher:
+    def __init__(self, path, on_change, interval=5.0):
+        """Poll the `.env` file and pass new detection parameters to `on_change`
+
+        Only `DetectionConfig.ENV_VARS` are applied while the app runs. Other
+        changes (e.g. `AUDIO_RATE` or `AUDIO_CHUNK`, which would need the
+        stream re-opened) are logged and left for the next start, and invalid
+        values are refused: the running parameters are kept.
+
+        Args:
+            path (str): The `.env` file.
+            on_change (Callable[[DetectionConfig], None]): Called from the watcher thread.
+            interval (float, optional): Polling period in seconds. (default: `5.0`)
+        """
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.mtime = self._mtime()
+        self.values = dotenv.dotenv_values(path)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="config-watcher", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            config = self.check()
+            if config is not None:
+                self.on_change(config)
+
+    def check(self):
+        """Read the file again if it has changed since the last check
+
+        Returns:
+            DetectionConfig | None: The new parameters, or None if they are unchanged.
+        """
+        mtime = self._mtime()
+        if mtime is None or mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        values = dotenv.dotenv_values(self.path)
+        changed = sorted(
+            key
+            for key in values.keys() | self.values.keys()
+            if values.get(key) != self.values.get(key)
+        )
+        self.values = values
+        staged = [key for key in changed if key not in DetectionConfig.ENV_VARS]
+        if staged:
+            logger.warning(
+                f"Changed in {self.path}, applied at the next start: {', '.join(staged)}"
+            )
+        if len(staged) == len(changed):
+            return None
+        try:
+            # variables not in the file come from the environment, as at start-up
+            config = DetectionConfig.from_env({**os.environ, **values})
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Detection parameters not reloaded. error: {e!r}")
+            return None
+        logger.info(
+            f"Reload detection parameters. threshold: {config.threshold}, "
+            f"consecutive: {config.consecutive_sec} s, interval: {config.interval_sec} s, "
+            f"duration: {config.duration} s"
+        )
+        return config
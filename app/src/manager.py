@@ -1,38 +1,153 @@
+import random
+import threading
 import time
 
-from app.src.auto_unlock import AutoUnlockApp, AutoUnlockAppWAuth
-from app.utils import logger, settings, slack
+from app.src.auto_unlock import AutoUnlockApp, AutoUnlockAppWAuth, MultiEntranceApp
+from app.src.config_watcher import ConfigWatcher
+from app.utils import (
+    ENV_FILE,
+    logger,
+    metrics,
+    preload,
+    profiler,
+    settings,
+    slack,
+    start_metrics_server,
+)
+
+restarts_total = metrics.counter(
+    "auto_unlock_restarts_total", "Restarts of the app after an error"
+)
+recovery_seconds = metrics.histogram(
+    "auto_unlock_recovery_seconds", "Time from an error to the restart of the app"
+)
+
+
+class Backoff:
+    def __init__(self, minimum, maximum):
+        """Exponential backoff with jitter
+
+        The delay doubles after each attempt, from `minimum` up to `maximum`,
+        and a random part of up to half of it is taken off, so that several
+        units failing on a shared outage do not retry in step.
+
+        Args:
+            minimum (float): First delay in seconds.
+            maximum (float): Longest delay in seconds.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.attempts = 0
+
+    def next(self):
+        """Delay before the next attempt, in seconds"""
+        delay = min(self.minimum * 2**self.attempts, self.maximum)
+        self.attempts += 1
+        return delay * random.uniform(0.5, 1.0)
+
+    def reset(self):
+        self.attempts = 0
 
 
 class AutoUnlockAppManager:
     def __init__(self, is_authenticating=True):
         logger.info("Start AutoUnlockApp.")
-        slack.post_text(channel=settings.SLACK_CHANNEL, text=logger.get_log_message())
-        if is_authenticating:
-            self.app = AutoUnlockAppWAuth()
-        else:
-            self.app = AutoUnlockApp()
+        start_message = logger.get_log_message()
+        metrics.gauge(
+            "auto_unlock_start_time_seconds", "Unix time the app started"
+        ).set(time.time())
+        if settings.METRICS_PORT:
+            start_metrics_server(metrics, settings.METRICS_PORT, settings.METRICS_HOST)
+            logger.info(
+                f"Serve metrics on http://{settings.METRICS_HOST}:{settings.METRICS_PORT}/metrics"
+            )
+        with profiler.step("create app"):
+            if settings.ENTRANCES:
+                self.app = MultiEntranceApp(settings.ENTRANCES, is_authenticating)
+            elif is_authenticating:
+                self.app = AutoUnlockAppWAuth()
+            else:
+                self.app = AutoUnlockApp()
+
+        self.config_watcher = None
+        if settings.CONFIG_RELOAD_SEC > 0 and ENV_FILE:
+            self.config_watcher = ConfigWatcher(
+                ENV_FILE, self._reload, settings.CONFIG_RELOAD_SEC
+            )
+            self.config_watcher.start()
+
+        # The audio stream is open: load the HTTP/Slack clients and post the start
+        # message in the background instead of before the first frame.
+        preload("requests", "slack_sdk")
+        threading.Thread(
+            target=self._post_text, args=(start_message,), daemon=True
+        ).start()
+        if profiler.enabled:
+            first_app = getattr(self.app, "apps", [self.app])[0]
+            first_app.on_first_analysed = self._report_startup
+
+    def _post_text(self, text):
+        try:
+            slack.post_text(channel=settings.SLACK_CHANNEL, text=text)
+        except Exception as e:
+            logger.error(e)
+
+    def _reload(self, config):
+        # each entrance applies it between two chunks, see `AutoUnlockApp.step`
+        for app in getattr(self.app, "apps", [self.app]):
+            app.next_config = config
+
+    def _report_startup(self):
+        profiler.mark("first frame analysed")
+        profiler.disable()
+        logger.info(profiler.report())
 
     def __call__(self):
         self._auto_unlock()
         self._cleanup()
 
     def _auto_unlock(self):
-        try:
-            self.app()
-        except Exception:
-            time.sleep(10)
+        """Run the app until it stops by itself, restarting it after errors
+
+        A restart re-opens only the audio streams that failed or stalled, after
+        a backoff that starts at `RESTART_BACKOFF_MIN_MS` and is reset once the
+        app has run for `RESTART_STABLE_SEC`.
+        """
+        backoff = Backoff(
+            settings.RESTART_BACKOFF_MIN_MS / 1000,
+            settings.RESTART_BACKOFF_MAX_MS / 1000,
+        )
+        while True:
+            started_at = time.monotonic()
+            try:
+                self.app()
+                return
+            except Exception as e:
+                failed_at = time.monotonic()
+                restarts_total.inc()
+                if failed_at - started_at >= settings.RESTART_STABLE_SEC:
+                    backoff.reset()
+                logger.warning(f"AutoUnlockApp failed. error: {e!r}")
+            self._recover(backoff)
+            elapsed = time.monotonic() - failed_at
+            recovery_seconds.observe(elapsed)
+            logger.warning(f"Restart AutoUnlockApp. recovery: {elapsed * 1000:.0f} ms")
+            threading.Thread(
+                target=self._post_text, args=(logger.get_log_message(),), daemon=True
+            ).start()
+
+    def _recover(self, backoff):
+        while True:
+            time.sleep(backoff.next())
             try:
-                logger.warning("Restart AutoUnlockApp.")
-                slack.post_text(
-                    channel=settings.SLACK_CHANNEL,
-                    text=logger.get_log_message(),
-                )
+                self.app.recover()
+                return
             except Exception as e:
-                logger.error(e)
-            self._auto_unlock()
+                logger.warning(f"Failed to re-open the audio input. error: {e!r}")
 
     def _cleanup(self):
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
         self.app._cleanup()
 
         logger.warning("End AutoUnlockApp.")
@@ -2,21 +2,130 @@ import base64
 import hashlib
 import hmac
 import json
+import threading
 import time
 
-import requests
-from requests.exceptions import RequestException
+from app.utils import logger, metrics, settings
 
-from app.utils import logger, settings
+switch_bot_latency = metrics.histogram(
+    "switchbot_request_seconds", "SwitchBot API round-trip time"
+)
+switch_bot_errors = metrics.counter(
+    "switchbot_request_errors_total", "Failed SwitchBot API requests"
+)
 
 
 class SwitchBot:
     SWITCH_BOT_API_URL = "https://api.switch-bot.com"
     VERSION = "v1.1"
 
-    def __init__(self):
+    def __init__(self, api_url=SWITCH_BOT_API_URL, pool_maxsize=2):
+        """Constructor of SwitchBot
+
+        Requests go through one pooled keep-alive session, so only the first
+        request (or `warm_up`) pays for DNS, TCP and TLS setup. `prepare`
+        also signs and serialises a command ahead of time.
+
+        Args:
+            api_url (str, optional): API base URL. (default: `SWITCH_BOT_API_URL`)
+            pool_maxsize (int, optional): Connections kept alive, one per concurrent caller. \
+                (default: `2`)
+        """
         self.switch_bot_token = settings.SWITCH_BOT_TOKEN
         self.switch_bot_secret = settings.SWITCH_BOT_SECRET
+        self.api_url = api_url
+        self.timeout = (
+            settings.SWITCH_BOT_CONNECT_TIMEOUT_SEC,
+            settings.SWITCH_BOT_READ_TIMEOUT_SEC,
+        )
+        self.sign_ttl = settings.SWITCH_BOT_SIGN_TTL_SEC
+        self._lock = threading.Lock()  # guards the prepare state below
+        # (deviceId, command) -> (monotonic time, request, send kwargs)
+        self._prepared = {}
+        self._presses = 0  # `control_device` calls, to drop a prepare they overtook
+        self._wanted = None  # (deviceId, command) for the prepare worker
+        self._wanted_ready = threading.Event()
+        self._worker = None
+        self._closed = False
+        # requests is imported here rather than at module level to keep it off the startup path
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def warm_up(self, wait=True):
+        """Open the pooled connection ahead of the next command
+
+        Args:
+            wait (bool, optional): Block until connected, or connect in a background thread. (default: `True`)
+        """
+        if not wait:
+            threading.Thread(target=self.warm_up, daemon=True).start()
+            return
+        try:
+            self.session.head(self.api_url, timeout=self.timeout)
+            logger.debug("SwitchBot connection warmed up.")
+        except OSError as e:  # requests.RequestException is an OSError
+            logger.warning(f"SwitchBot warm up failed: {e}")
+
+    def prepare(self, deviceId, command, wait=True):
+        """Sign and serialise a `control_device` request, and connect, ahead of time
+
+        `control_device` then sends it as is, unless the signature is older
+        than `SWITCH_BOT_SIGN_TTL_SEC`, in which case it is signed again.
+
+        In the background, one worker prepares at a time: calls made while it
+        is busy are merged into one, and a command prepared less than half the
+        TTL ago is kept, so a ring that keeps starting and stopping does not
+        send a request each time. A prepare finishing after `control_device`
+        has sent the command is dropped.
+
+        Args:
+            deviceId (str): Device ID.
+            command (str): Command name.
+            wait (bool, optional): Block until connected, or prepare in a background thread. \
+                (default: `True`)
+        """
+        if wait:
+            self._prepare((deviceId, command))
+            return
+        with self._lock:
+            self._wanted = (deviceId, command)
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._prepare_loop, name="switchbot-prepare", daemon=True
+                )
+                self._worker.start()
+        self._wanted_ready.set()
+
+    def _prepare_loop(self):
+        while self._wanted_ready.wait() and not self._closed:
+            with self._lock:
+                self._wanted_ready.clear()
+                key, self._wanted = self._wanted, None
+            if key is not None:
+                self._prepare(key)
+
+    def _prepare(self, key):
+        with self._lock:
+            prepared = self._prepared.get(key)
+            presses = self._presses
+        if prepared is not None and time.monotonic() - prepared[0] < self.sign_ttl / 2:
+            return
+        prepared = self._command_request(*key)
+        with self._lock:
+            if self._presses != presses:
+                return  # the command went out meanwhile, signed on the spot
+            self._prepared[key] = prepared
+        self.warm_up()
+
+    def close(self):
+        self._closed = True
+        self._wanted_ready.set()
+        self.session.close()
 
     def __init_headers(self):
         nonce = ""
@@ -40,43 +149,64 @@ class SwitchBot:
 
     def _get_request(self, url, headers):
         try:
-            res = requests.get(url, headers=headers)
-            data = res.json()
+            with switch_bot_latency.time():
+                res = self.session.get(url, headers=headers, timeout=self.timeout)
+                data = res.json()
             logger.info(f"Response: {data}")
             if data["message"] == "success":
                 return data
             else:
                 return {}
-        except RequestException as e:
+        except OSError as e:
+            switch_bot_errors.inc()
             raise e
 
-    def _post_request(self, url, params, headers):
-        logger.debug(f"POST request to {url}, params: {params}")
+    def _command_request(self, deviceId, command):
+        import requests
+
+        url = f"{self.api_url}/{self.VERSION}/devices/{deviceId}/commands"
+        params = {
+            "command": command,
+            "parameter": "",
+            "commandType": "command",
+        }
+        request = self.session.prepare_request(
+            requests.Request(
+                "POST", url, data=json.dumps(params), headers=self.__init_headers()
+            )
+        )
+        # proxy and CA bundle settings from the environment, as `session.post` does
+        kwargs = self.session.merge_environment_settings(url, {}, None, None, None)
+        return time.monotonic(), request, kwargs
+
+    def _send(self, request, kwargs):
+        logger.debug(f"POST request to {request.url}, body: {request.body}")
 
         try:
-            res = requests.post(url, data=json.dumps(params), headers=headers)
-            data = res.json()
+            with switch_bot_latency.time():
+                res = self.session.send(request, timeout=self.timeout, **kwargs)
+                data = res.json()
             logger.info(f"Response: {data}")
             return data
-        except RequestException as e:
+        except OSError as e:
+            switch_bot_errors.inc()
             raise e
 
     def get_device_list(self):
         headers = self.__init_headers()
-        url = f"{self.SWITCH_BOT_API_URL}/{self.VERSION}/devices"
+        url = f"{self.api_url}/{self.VERSION}/devices"
 
         res = self._get_request(url, headers)["body"]
         return res
 
     def control_device(self, deviceId, command):
-        headers = self.__init_headers()
-        url = f"{self.SWITCH_BOT_API_URL}/{self.VERSION}/devices/{deviceId}/commands"
-        params = {
-            "command": command,
-            "parameter": "",
-            "commandType": "command",
-        }
-        return self._post_request(url, params, headers)
+        with self._lock:
+            self._presses += 1
+            prepared = self._prepared.pop((deviceId, command), None)
+        if prepared is None or time.monotonic() - prepared[0] > self.sign_ttl:
+            prepared = self._command_request(deviceId, command)
+        _, request, kwargs = prepared
+        return self._send(request, kwargs)
 
 
 def main():
@@ -0,0 +1,209 @@
+import argparse
+import email
+import json
+import os
+import ssl
+import struct
+import subprocess
+import threading
+import time
+from email import policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the real APIs
+    disable_nagle_algorithm = True
+
+    def read_body(self):
+        """Read the request body, with or without chunked transfer encoding
+
+        The body is read at `server.read_bps` bytes per second at most
+        (0: as fast as it comes), standing in for the uplink of the unit.
+
+        Returns:
+            bytes: Body
+        """
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            parts = []
+            while size := int(self.rfile.readline().strip(), 16):
+                parts.append(self._read(size))
+                self.rfile.readline()
+            self.rfile.readline()
+            return b"".join(parts)
+        return self._read(int(self.headers.get("Content-Length", 0)))
+
+    def _read(self, size):
+        data = self.rfile.read(size)
+        if self.server.read_bps:
+            time.sleep(size / self.server.read_bps)
+        return data
+
+    def reply(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.reply({})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AutoUnlockAPIHandler(StandInHandler):
+    def do_POST(self):
+        """Authorise every call, and decode the WAV file of an upload
+
+        Each upload is appended to `server.uploads` as a dict with the time
+        the last byte arrived, the body size and the WAV format.
+        """
+        body = self.read_body()
+        upload = {"received_at": time.monotonic(), "bytes": len(body)}
+        if body:
+            try:
+                upload.update(parse_wav_upload(self.headers["Content-Type"], body))
+            except (struct.error, ValueError) as e:
+                self.send_error(400, f"Not a WAV upload: {e}")
+                return
+        self.server.uploads.append(upload)
+        time.sleep(self.server.delay)
+        self.reply({"phrase_authorized": True})
+
+
+class SwitchBotHandler(StandInHandler):
+    def do_GET(self):
+        self.reply({"statusCode": 100, "message": "success", "body": {}})
+
+    def do_POST(self):
+        self.read_body()
+        self.reply({"statusCode": 100, "message": "success", "body": {}})
+
+
+def parse_wav_upload(content_type, body):
+    """Format of the WAV file in a multipart/form-data body
+
+    Args:
+        content_type (str): Content-Type header, with the boundary.
+        body (bytes): Request body.
+
+    Returns:
+        dict: `channels`, `rate`, `frames` and `format_tag` of the file, and the \
+            other form fields.
+    """
+    message = email.message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body, policy=policy.HTTP
+    )
+    result = {"fields": {}}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if part.get_filename() is None:
+            result["fields"][name] = part.get_content()
+            continue
+        wav = part.get_payload(decode=True)
+        format_tag, channels, rate, _, block_align, _ = struct.unpack(
+            "<HHIIHH", wav[20:36]
+        )
+        result.update(
+            channels=channels,
+            rate=rate,
+            frames=(len(wav) - 44) // block_align,
+            format_tag=format_tag,
+        )
+    return result
+
+
+def self_signed_cert(directory, host="localhost"):
+    """Create a certificate for `host` with `openssl`
+
+    Args:
+        directory (str): Where to write the files.
+        host (str, optional): Host name of the certificate. (default: `"localhost"`)
+
+    Returns:
+        tuple[str, str]: Certificate and key files.
+    """
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    command = (
+        "openssl req -x509 -newkey rsa:2048 -nodes -days 1 "
+        f"-subj /CN={host} -addext subjectAltName=DNS:{host}"
+    ).split()
+    subprocess.run(
+        command + ["-keyout", key, "-out", cert], check=True, capture_output=True
+    )
+    return cert, key
+
+
+def start_server(handler, host="localhost", port=0, tls=None, read_bps=0, delay=0):
+    """Serve a stand-in from a daemon thread
+
+    Args:
+        handler (type[StandInHandler]): Stand-in API.
+        host (str, optional): Address to listen on. (default: `"localhost"`)
+        port (int, optional): Port. (default: `0`, any free port)
+        tls (tuple[str, str], optional): Certificate and key files, to serve HTTPS.
+        read_bps (float, optional): Bytes per second the request bodies are read at. \
+            (default: `0`, unthrottled)
+        delay (float, optional): Seconds before an upload is answered. (default: `0`)
+
+    Returns:
+        ThreadingHTTPServer: Server, with its base URL in `url`.
+    """
+    server = ThreadingHTTPServer((host, port), handler)
+    server.read_bps = read_bps
+    server.delay = delay
+    server.uploads = []
+    scheme = "http"
+    if tls is not None:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*tls)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    server.url = f"{scheme}://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-ins of the external APIs."
+    )
+    parser.add_argument("api", choices=["auto-unlock", "switchbot"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cert", help="serve HTTPS with this certificate")
+    parser.add_argument("--key", help="private key of --cert")
+    parser.add_argument(
+        "--mbps", type=float, default=0, help="uplink throughput (0: unthrottled)"
+    )
+    parser.add_argument(
+        "--delay", type=float, default=0, help="seconds before an upload is answered"
+    )
+    args = parser.parse_args()
+
+    handler = AutoUnlockAPIHandler if args.api == "auto-unlock" else SwitchBotHandler
+    server = start_server(
+        handler,
+        args.host,
+        args.port,
+        (args.cert, args.key) if args.cert else None,
+        args.mbps * 1e6 / 8,
+        args.delay,
+    )
+    print(f"Serving the {args.api} stand-in on {server.url}")
+    try:
+        while True:
+            time.sleep(1)
+            while server.uploads:
+                print(server.uploads.pop(0))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
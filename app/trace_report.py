@@ -0,0 +1,103 @@
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+
+from app.utils import settings
+
+PERCENTILES = (50, 95, 99)
+
+
+def journal_files(path):
+    """Files of a rotated journal, oldest first
+
+    Args:
+        path (str): Trace journal.
+
+    Returns:
+        list[str]: Rotated journals (`path.N` ... `path.1`) that exist, then `path`.
+    """
+    backups = [
+        p for p in glob.glob(glob.escape(path) + ".*") if p.rsplit(".", 1)[1].isdigit()
+    ]
+    backups.sort(key=lambda p: int(p.rsplit(".", 1)[1]), reverse=True)
+    return backups + [path] if os.path.exists(path) else backups
+
+
+def load(path, kind=None):
+    """Read the traces of a journal and of its rotated files
+
+    Args:
+        path (str): Trace journal (JSON lines).
+        kind (str, optional): Keep only traces of this kind.
+
+    Returns:
+        list[dict]: Traces
+    """
+    traces = []
+    for file in journal_files(path):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                trace = json.loads(line)
+                if kind is None or trace["kind"] == kind:
+                    traces.append(trace)
+    return traces
+
+
+def stage_durations(traces):
+    """Group span durations by stage, in order of first appearance
+
+    Args:
+        traces (list[dict]): Traces
+
+    Returns:
+        dict[str, list[float]]: Durations in seconds per stage, plus `total`.
+    """
+    stages = {}
+    for trace in traces:
+        for name, (_, duration) in trace["spans"].items():
+            stages.setdefault(name, []).append(duration)
+    stages["total"] = [trace["total"] for trace in traces]
+    return stages
+
+
+def report(stages):
+    print(
+        f"{'stage':<16}{'n':>6}"
+        + "".join(f"{'p' + str(p):>10}" for p in PERCENTILES)
+        + f"{'max':>10}  (ms)"
+    )
+    for name, durations in stages.items():
+        if not durations:
+            continue
+        ms = np.asarray(durations) * 1000
+        values = np.percentile(ms, PERCENTILES)
+        print(
+            f"{name:<16}{len(ms):>6}"
+            + "".join(f"{v:>10.1f}" for v in values)
+            + f"{ms.max():>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print p50/p95/p99 per stage of the event traces."
+    )
+    parser.add_argument(
+        "path", nargs="?", default=settings.TRACE_FILE, help="trace journal"
+    )
+    parser.add_argument("--kind", help="only events of this kind (call, unlock)")
+    args = parser.parse_args()
+
+    traces = load(args.path, args.kind)
+    print(f"{args.path}: {len(traces)} traces")
+    if traces:
+        report(stage_durations(traces))
+
+
+if __name__ == "__main__":
+    main()
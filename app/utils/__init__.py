@@ -1,22 +1,46 @@
-from app.utils.config import Settings
-from app.utils.log import (
-    ConsoleHandlerInfo,
-    RotatingFileHandlerInfo,
-    StringHandlerInfo,
-    get_logger,
-)
-from app.utils.slack import Slack
+from app.utils.startup import StartupProfiler, preload, profiler
+
+with profiler.step("import app.utils"):
+    from app.utils.config import ENV_FILE, DetectionConfig, EntranceInfo, Settings
+    from app.utils.log import (
+        ConsoleHandlerInfo,
+        RotatingFileHandlerInfo,
+        StringHandlerInfo,
+        get_logger,
+    )
+    from app.utils.metrics import metrics, start_metrics_server
+    from app.utils.slack import Slack, SlackNotifier
+    from app.utils.trace import Trace, Tracer
 
-settings = Settings()
-logger = get_logger(
-    settings.PROJECT_NAME,
-    ch_info=ConsoleHandlerInfo(log_level=settings.LOGGING_LEVEL),
-    sh_info=StringHandlerInfo(),
-    fh_info=RotatingFileHandlerInfo(
-        log_level=settings.LOGGING_LEVEL,
-        filename="log/application.log",
-        backupCount=settings.LOGGING_BACKUP_COUNT,
-        maxGBytes=settings.LOGFILE_SIZE_GB,
-    ),
+with profiler.step("create settings"):
+    settings = Settings()
+with profiler.step("create logger"):
+    logger = get_logger(
+        settings.PROJECT_NAME,
+        ch_info=ConsoleHandlerInfo(log_level=settings.LOGGING_LEVEL),
+        sh_info=StringHandlerInfo(),
+        fh_info=RotatingFileHandlerInfo(
+            log_level=settings.LOGGING_LEVEL,
+            filename="log/application.log",
+            backupCount=settings.LOGGING_BACKUP_COUNT,
+            maxGBytes=settings.LOGFILE_SIZE_GB,
+        ),
+        use_queue=settings.LOGGING_USE_QUEUE,
+    )
+tracer = Tracer(
+    settings.TRACE_FILE,
+    max_bytes=int(settings.TRACE_FILE_SIZE_MB * 1024 * 1024),
+    backup_count=settings.TRACE_BACKUP_COUNT,
 )
-slack = Slack(settings.SLACK_API_TOKEN)
+with profiler.step("create slack"):
+    # no network here: the client and channel cache are built on first post
+    slack = Slack(
+        settings.SLACK_API_TOKEN, channel_ttl_sec=settings.SLACK_CHANNEL_TTL_SEC
+    )
+    if settings.SLACK_NOTIFIER_MODE == "background":
+        slack = SlackNotifier(
+            slack,
+            max_queue=settings.SLACK_QUEUE_SIZE,
+            batch_sec=settings.SLACK_BATCH_SEC,
+            spill_file=settings.SLACK_SPILL_FILE,
+        )
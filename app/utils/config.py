@@ -1,9 +1,115 @@
 import os
 
 import dotenv
-import pyaudio
 
-dotenv.load_dotenv()
+ENV_FILE = dotenv.find_dotenv()  # empty if there is none
+dotenv.load_dotenv(ENV_FILE)
+
+
+class EntranceInfo:
+    def __init__(
+        self, name, device=None, channel=None, unlock_bot_id=None, api_url=None
+    ):
+        """Entrance watched by one microphone (or one channel of it)
+
+        Args:
+            name (str): Entrance name.
+            device (int, optional): PortAudio input device index. (default: default device)
+            channel (int, optional): Input channel of the intercom. (default: any channel)
+            unlock_bot_id (str, optional): SwitchBot pressed for this entrance.
+            api_url (str, optional): Auto Unlock API URL of this entrance.
+        """
+        self.name = name
+        self.device = device
+        self.channel = channel
+        self.unlock_bot_id = unlock_bot_id
+        self.api_url = api_url
+
+
+def _optional_int(value):
+    return int(value) if value not in (None, "") else None
+
+
+def load_entrances(names, unlock_bot_id, api_url):
+    """Read `ENTRANCE_<NAME>_{DEVICE,CHANNEL,BOT_ID,API_URL}` for each entrance
+
+    Args:
+        names (str): Comma separated entrance names.
+        unlock_bot_id (str): Default SwitchBot ID.
+        api_url (str): Default Auto Unlock API URL.
+
+    Returns:
+        list[EntranceInfo]: Entrances
+    """
+    entrances = []
+    for name in (n.strip() for n in names.split(",")):
+        if not name:
+            continue
+        prefix = f"ENTRANCE_{name.upper()}_"
+        entrances.append(
+            EntranceInfo(
+                name,
+                device=_optional_int(os.getenv(prefix + "DEVICE")),
+                channel=_optional_int(os.getenv(prefix + "CHANNEL")),
+                unlock_bot_id=os.getenv(prefix + "BOT_ID", unlock_bot_id),
+                api_url=os.getenv(prefix + "API_URL", api_url),
+            )
+        )
+    return entrances
+
+
+class DetectionConfig:
+    # variables that can change while the app runs; the others need a restart
+    ENV_VARS = (
+        "AUDIO_THRESHOLD",
+        "CONSECUTIVE_SEC_THRESHOLD",
+        "INTERVAL_SEC_THRESHOLD",
+        "RECORDING_DURATION_SEC",
+    )
+
+    def __init__(self, threshold, consecutive_sec, interval_sec, duration):
+        """Detection parameters, applied as a whole to a running app
+
+        Args:
+            threshold (float): Normalized peak threshold in [0, 1] (peak detector).
+            consecutive_sec (float): Active time before a ring is an event call.
+            interval_sec (float): Shortest time between two event calls.
+            duration (int): Passphrase recording length in seconds.
+
+        Raises:
+            ValueError: A parameter is out of range.
+        """
+        if not 0 <= threshold <= 1:
+            raise ValueError(f"AUDIO_THRESHOLD is not in [0, 1]: {threshold}")
+        if consecutive_sec < 0 or interval_sec < 0:
+            raise ValueError("CONSECUTIVE/INTERVAL_SEC_THRESHOLD must not be negative")
+        if duration <= 0:
+            raise ValueError(f"RECORDING_DURATION_SEC must be positive: {duration}")
+        self.threshold = threshold
+        self.consecutive_sec = consecutive_sec
+        self.interval_sec = interval_sec
+        self.duration = duration
+
+    @classmethod
+    def from_env(cls, env):
+        """Read the parameters from a mapping of environment variables
+
+        Args:
+            env (Mapping[str, str]): e.g. `os.environ`, or the values of a `.env` file.
+
+        Returns:
+            DetectionConfig: Parameters
+
+        Raises:
+            KeyError: A variable is missing.
+            ValueError: A value is not a number or is out of range.
+        """
+        return cls(
+            float(env["AUDIO_THRESHOLD"]),
+            float(env["CONSECUTIVE_SEC_THRESHOLD"]),
+            int(env["INTERVAL_SEC_THRESHOLD"]),
+            int(env["RECORDING_DURATION_SEC"]),
+        )
 
 
 class Settings:
@@ -17,19 +123,96 @@ class Settings:
     AUTO_UNLOCK_API_URL = os.getenv("AUTO_UNLOCK_API_URL")
     CONSECUTIVE_SEC_THRESHOLD = float(os.getenv("CONSECUTIVE_SEC_THRESHOLD"))
     INTERVAL_SEC_THRESHOLD = int(os.getenv("INTERVAL_SEC_THRESHOLD"))
-    FORMAT = pyaudio.paInt16
     DURATION = int(os.getenv("RECORDING_DURATION_SEC"))
+    PRE_ROLL_SEC = float(os.getenv("RECORDING_PRE_ROLL_SEC", 1))
+    PRE_ROLL_CHUNKS = int(PRE_ROLL_SEC * RATE / CHUNK)
+    # trailing silence that ends a recording early; 0: always record DURATION
+    ENDPOINT_SILENCE_SEC = float(os.getenv("RECORDING_ENDPOINT_SILENCE_SEC", 0.8))
+    ENDPOINT_MIN_SEC = float(os.getenv("RECORDING_ENDPOINT_MIN_SEC", 1))
+    ENDPOINT_PAD_SEC = float(os.getenv("RECORDING_ENDPOINT_PAD_SEC", 0.2))
+    ENDPOINT_MARGIN_DB = float(os.getenv("RECORDING_ENDPOINT_MARGIN_DB", 10))
+    ENDPOINT_MIN_LEVEL = float(os.getenv("RECORDING_ENDPOINT_MIN_LEVEL", 0.01))
+    UPLOAD_MODE = os.getenv("RECORDING_UPLOAD_MODE", "buffered")  # buffered, streaming
+    UPLOAD_RATE = int(os.getenv("RECORDING_UPLOAD_RATE", 0))  # 0: capture rate
+    UPLOAD_MONO = bool(int(os.getenv("RECORDING_UPLOAD_MONO", 0)))
+    UPLOAD_CODEC = os.getenv("RECORDING_UPLOAD_CODEC", "pcm")  # pcm, ulaw
+    RECORDING_SAVE_DIR = os.getenv("RECORDING_SAVE_DIR", "")  # empty: keep in memory
+    AUTO_UNLOCK_API_CONNECT_TIMEOUT_SEC = float(
+        os.getenv("AUTO_UNLOCK_API_CONNECT_TIMEOUT_SEC", 3.05)
+    )
+    # counted once the upload has been sent, so a streamed recording does not use it up
+    AUTO_UNLOCK_API_READ_TIMEOUT_SEC = float(
+        os.getenv("AUTO_UNLOCK_API_READ_TIMEOUT_SEC", 10)
+    )
 
-    CONSECUTIVE_FRAMES_THRESHOLD = int(CONSECUTIVE_SEC_THRESHOLD) * (RATE / CHUNK)
-    INTERVAL_FRAMES_THRESHOLD = int(INTERVAL_SEC_THRESHOLD) * (RATE / CHUNK)
+    DETECTOR = os.getenv("AUDIO_DETECTOR", "peak")  # peak, goertzel, adaptive
+    CHIME_FREQUENCIES = [
+        float(f) for f in os.getenv("CHIME_FREQUENCIES", "").split(",") if f.strip()
+    ]
+    CHIME_POWER_RATIO = float(os.getenv("CHIME_POWER_RATIO", 0.3))
+    CHIME_MIN_LEVEL = float(os.getenv("CHIME_MIN_LEVEL", 0.01))
+    NOISE_MARGIN_DB = float(os.getenv("NOISE_MARGIN_DB", 15))
+    NOISE_FLOOR_TIME_SEC = float(os.getenv("NOISE_FLOOR_TIME_SEC", 60))
+    NOISE_MIN_LEVEL = float(os.getenv("NOISE_MIN_LEVEL", 0.005))
+    NOISE_FLOOR_STATE_FILE = os.getenv("NOISE_FLOOR_STATE_FILE", "log/noise_floor.json")
+
+    # >1: low-pass and decimate by this factor before detection (AUDIO_CHUNK a multiple)
+    DETECTION_DECIMATION = int(os.getenv("AUDIO_DETECTION_DECIMATION", 1))
+
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 64))
+    ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 0))  # 0: on the event loop
+    ANALYSIS_BATCH_CHUNKS = int(os.getenv("ANALYSIS_BATCH_CHUNKS", 2))
+    ANALYSIS_SLOTS = int(os.getenv("ANALYSIS_SLOTS", 8))
+
+    CAPTURE_MODE = os.getenv("AUDIO_CAPTURE_MODE", "blocking")  # blocking, callback
+    RING_BUFFER_SEC = float(os.getenv("AUDIO_RING_BUFFER_SEC", 5))
+    RING_BUFFER_CHUNKS = max(int(RING_BUFFER_SEC * RATE / CHUNK), 1)
+    # callback mode, no chunk for this long: re-open the stream (0: 1 second)
+    AUDIO_STALL_TIMEOUT_MS = int(os.getenv("AUDIO_STALL_TIMEOUT_MS", 2000))
+    # restart delay after an error: doubles up to MAX, reset after STABLE_SEC of uptime
+    RESTART_BACKOFF_MIN_MS = int(os.getenv("RESTART_BACKOFF_MIN_MS", 100))
+    RESTART_BACKOFF_MAX_MS = int(os.getenv("RESTART_BACKOFF_MAX_MS", 30000))
+    RESTART_STABLE_SEC = float(os.getenv("RESTART_STABLE_SEC", 60))
+    # shared by detection and recording; has to hold the pre-roll
+    AUDIO_BUS_SEC = float(os.getenv("AUDIO_BUS_SEC", 5))
+    AUDIO_BUS_CHUNKS = max(int(AUDIO_BUS_SEC * RATE / CHUNK), PRE_ROLL_CHUNKS + 3)
+
+    DETECTION = DetectionConfig(
+        THRESHOLD, CONSECUTIVE_SEC_THRESHOLD, INTERVAL_SEC_THRESHOLD, DURATION
+    )
+    # poll the .env file and apply DetectionConfig.ENV_VARS changes (0: disabled)
+    CONFIG_RELOAD_SEC = float(os.getenv("CONFIG_RELOAD_SEC", 5))
 
     SWITCH_BOT_TOKEN = os.getenv("SWITCH_BOT_TOKEN")
     SWITCH_BOT_SECRET = os.getenv("SWITCH_BOT_SECRET")
     UNLOCK_BOT_ID = os.getenv("UNLOCK_BOT_ID")
+    # empty: one entrance on the default device, UNLOCK_BOT_ID and AUTO_UNLOCK_API_URL
+    ENTRANCES = load_entrances(
+        os.getenv("ENTRANCES", ""), UNLOCK_BOT_ID, AUTO_UNLOCK_API_URL
+    )
+    SWITCH_BOT_CONNECT_TIMEOUT_SEC = float(
+        os.getenv("SWITCH_BOT_CONNECT_TIMEOUT_SEC", 3.05)
+    )
+    SWITCH_BOT_READ_TIMEOUT_SEC = float(os.getenv("SWITCH_BOT_READ_TIMEOUT_SEC", 10))
+    # a command signed when a ring starts is sent as is for this long, then signed again
+    SWITCH_BOT_SIGN_TTL_SEC = float(os.getenv("SWITCH_BOT_SIGN_TTL_SEC", 30))
 
     SLACK_API_TOKEN = os.getenv("SLACK_API_TOKEN")
     SLACK_CHANNEL = os.getenv("SLACK_CHANNEL")
+    SLACK_CHANNEL_TTL_SEC = float(os.getenv("SLACK_CHANNEL_TTL_SEC", 3600))
+    SLACK_NOTIFIER_MODE = os.getenv("SLACK_NOTIFIER_MODE", "sync")  # sync, background
+    SLACK_QUEUE_SIZE = int(os.getenv("SLACK_QUEUE_SIZE", 100))
+    SLACK_BATCH_SEC = float(os.getenv("SLACK_BATCH_SEC", 1))
+    SLACK_SPILL_FILE = os.getenv("SLACK_SPILL_FILE", "log/slack_spill.jsonl")
 
     LOGGING_LEVEL = os.getenv("LOGGING_LEVEL")
     LOGGING_BACKUP_COUNT = int(os.getenv("LOGGING_BACKUP_COUNT"))
     LOGFILE_SIZE_GB = int(os.getenv("LOGFILE_SIZE_GB"))
+    LOGGING_USE_QUEUE = bool(int(os.getenv("LOGGING_USE_QUEUE", 0)))
+
+    TRACE_FILE = os.getenv("TRACE_FILE", "log/traces.jsonl")  # empty: disabled
+    TRACE_FILE_SIZE_MB = float(os.getenv("TRACE_FILE_SIZE_MB", 10))
+    TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", 1))
+
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # 0: disabled
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
@@ -1,7 +1,10 @@
+import atexit
 import logging
+import queue
+import time
 from datetime import datetime
 from logging import DEBUG, INFO, FileHandler, Formatter, StreamHandler
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 import pytz
 
@@ -16,17 +19,11 @@ class CustomLogger(logging.Logger):
         super().__init__(name)
         self.jst = pytz.timezone("Asia/Tokyo")
         self.string_handler = None
+        self.queue_listener = None
+        self._queued_handlers = []
         self.setLevel(DEBUG)
 
-    def _jst_time(self, *args):
-        """Get Japan Standard Time
-
-        Returns:
-            time.struct_time: JST
-        """
-        return datetime.now(self.jst).timetuple()
-
-    def settting_logger(self, ch_info, fh_info, sh_info):
+    def settting_logger(self, ch_info, fh_info, sh_info, use_queue=False):
         """Set logger
 
         Args:
@@ -34,7 +31,11 @@ class CustomLogger(logging.Logger):
             fh_info (FileHandlerInfo | RotatingFileHandlerInfo | TimedRotatingFileHandlerInfo): \
                 File handler information.
             sh_info (StringHandlerInfo): String handler information.
+            use_queue (bool, optional): Format and write console/file records on a background thread. \
+                (default: `False`)
         """
+        self.use_queue = use_queue
+
         if ch_info.is_use:
             self._set_console_handler(ch_info)
 
@@ -44,6 +45,35 @@ class CustomLogger(logging.Logger):
         if sh_info.is_use:
             self._set_string_handler(sh_info)
 
+        if use_queue and self._queued_handlers:
+            self._start_queue_listener()
+
+    def _add_handler(self, handler):
+        """Attach a handler directly, or behind the queue listener in queue mode"""
+        if self.use_queue:
+            self._queued_handlers.append(handler)
+        else:
+            self.addHandler(handler)
+
+    def _start_queue_listener(self):
+        """Move formatting and I/O of the queued handlers to a listener thread"""
+        log_queue = queue.SimpleQueue()
+        queue_handler = LogQueueHandler(log_queue)
+        queue_handler.setLevel(min(h.level for h in self._queued_handlers))
+        self.addHandler(queue_handler)
+
+        self.queue_listener = QueueListener(
+            log_queue, *self._queued_handlers, respect_handler_level=True
+        )
+        self.queue_listener.start()
+        atexit.register(self.stop_queue_listener)
+
+    def stop_queue_listener(self):
+        """Flush the queued records and stop the listener thread"""
+        if self.queue_listener is not None:
+            self.queue_listener.stop()
+            self.queue_listener = None
+
     def _decode_handler_info(self, handler_info):
         """Decode handler information
 
@@ -56,8 +86,7 @@ class CustomLogger(logging.Logger):
         """
         numeric_level = getattr(logging, handler_info.log_level, INFO)
 
-        formatter = Formatter(handler_info.format)
-        formatter.converter = self._jst_time
+        formatter = JSTFormatter(handler_info.format, self.jst)
 
         return numeric_level, formatter
 
@@ -72,7 +101,7 @@ class CustomLogger(logging.Logger):
         console_handler = StreamHandler()
         console_handler.setLevel(numeric_level)
         console_handler.setFormatter(formatter)
-        self.addHandler(console_handler)
+        self._add_handler(console_handler)
 
     def _set_file_handler(self, handler_info):
         """Set console handler
@@ -91,7 +120,7 @@ class CustomLogger(logging.Logger):
 
         file_handler.setLevel(numeric_level)
         file_handler.setFormatter(formatter)
-        self.addHandler(file_handler)
+        self._add_handler(file_handler)
 
     def _set_string_handler(self, handler_info):
         """Set console handler
@@ -101,6 +130,7 @@ class CustomLogger(logging.Logger):
         """
         numeric_level, formatter = self._decode_handler_info(handler_info)
 
+        # kept on the calling thread, so get_log_message() is never behind the queue
         self.string_handler = StringLogHandler()
         self.string_handler.setLevel(numeric_level)
         self.string_handler.setFormatter(formatter)
@@ -115,22 +145,63 @@ class CustomLogger(logging.Logger):
         return self.string_handler.get_log_message()
 
 
+class JSTFormatter(Formatter):
+    def __init__(self, fmt, tz):
+        """Formatter with timestamps in Japan Standard Time
+
+        The timezone conversion is cached on the record, so it runs once per
+        record however many handlers format it.
+
+        Args:
+            fmt (str): Log format.
+            tz (datetime.tzinfo): Timezone.
+        """
+        super().__init__(fmt)
+        self.tz = tz
+
+    def formatTime(self, record, datefmt=None):
+        ct = getattr(record, "jst_time", None)
+        if ct is None:
+            ct = datetime.fromtimestamp(record.created, self.tz).timetuple()
+            record.jst_time = ct
+        if datefmt:
+            return time.strftime(datefmt, ct)
+        s = time.strftime(self.default_time_format, ct)
+        return self.default_msec_format % (s, record.msecs)
+
+
+class LogQueueHandler(QueueHandler):
+    def prepare(self, record):
+        """Merge the arguments into the message, leave formatting to the listener
+
+        Args:
+            record (logging.LogRecord): Log record
+
+        Returns:
+            logging.LogRecord: Record to enqueue
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
 class StringLogHandler(logging.Handler):
     def __init__(self):
         super().__init__()
-        self.message = ""
+        self.record = None
 
     def emit(self, record):
-        """Emit log
+        """Emit log (formatting is deferred to `get_log_message`)
 
         Args:
             record (logging.LogRecord): Log record
         """
-        self.message = self.format(record)
+        self.record = record
 
     def get_log_message(self):
         """Get last log message"""
-        return self.message
+        record = self.record
+        return self.format(record) if record else ""
 
 
 class HandlerInfo:
@@ -222,6 +293,7 @@ def get_logger(
     ch_info=ConsoleHandlerInfo(is_use=False),
     fh_info=FileHandlerInfo(is_use=False),
     sh_info=StringHandlerInfo(is_use=False),
+    use_queue=False,
 ):
     """Retrieve a configured logger.
 
@@ -230,6 +302,8 @@ def get_logger(
         ch_info (ConsoleHandlerInfo, optional): Console handler information (default: ConsoleHandlerInfo(is_use=False)).
         fh_info (RotatingFileHandlerInfo, optional): File handler information (default: FileHandlerInfo(is_use=False)).
         sh_info (StringHandlerInfo, optional): String handler information (default: StringHandlerInfo(is_use=False)).
+        use_queue (bool, optional): Format and write console/file records on a background \
+            `QueueListener` thread (default: False).
 
     Example:
         >>> console_handler_info = ConsoleHandlerInfo(log_level="INFO")
@@ -252,5 +326,5 @@ def get_logger(
     """
     logging.setLoggerClass(CustomLogger)
     logger = logging.getLogger(name)
-    logger.settting_logger(ch_info, fh_info, sh_info)
+    logger.settting_logger(ch_info, fh_info, sh_info, use_queue=use_queue)
     return logger
@@ -0,0 +1,196 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield self.name, self.value
+
+
+def format_labels(labels):
+    """Prometheus label set, e.g. `{device="1"}` (empty for no labels)"""
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f"{{{pairs}}}"
+
+
+class Gauge:
+    type = "gauge"
+
+    def __init__(self, name, help, fn=None, labels=None):
+        """Gauge holding a value, or reading it from callbacks at scrape time
+
+        Each label set has its own callback. Binding one again replaces it,
+        so that an object created again after a restart takes over its series.
+
+        Args:
+            name (str): Metric name.
+            help (str): Description.
+            fn (callable, optional): Returns the current value.
+            labels (dict[str, str], optional): Labels of the series `fn` reads.
+        """
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.fns = {}  # formatted labels -> callback
+        if fn is not None:
+            self.bind(fn, labels)
+
+    def set(self, value):
+        self.value = value
+
+    def bind(self, fn, labels=None):
+        """Read the series with `labels` from `fn`, replacing its previous callback"""
+        self.fns[format_labels(labels)] = fn
+
+    def samples(self):
+        if not self.fns:
+            yield self.name, self.value
+        for labels, fn in list(self.fns.items()):
+            yield f"{self.name}{labels}", fn()
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        """Histogram with fixed buckets
+
+        An observation is one bisect over the (small, fixed) bucket bounds and
+        two additions; cumulative counts are only built at scrape time.
+
+        Args:
+            name (str): Metric name.
+            help (str): Description.
+            buckets (tuple[float], optional): Upper bounds. (default: `LATENCY_BUCKETS`)
+        """
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t)
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}}', cumulative
+        cumulative += counts[-1]
+        yield f'{self.name}_bucket{{le="+Inf"}}', cumulative
+        yield f"{self.name}_sum", total
+        yield f"{self.name}_count", cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Process-wide collection of counters, gauges and histograms"""
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, help=""):
+        return self._get_or_create(Counter, name, help)
+
+    def gauge(self, name, help="", fn=None, labels=None):
+        gauge = self._get_or_create(Gauge, name, help)
+        if fn is not None:
+            gauge.bind(fn, labels)
+        return gauge
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help, buckets=buckets)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format
+
+        Returns:
+            str: Metrics text
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(registry, port, host="127.0.0.1"):
+    """Serve `GET /metrics` from a daemon thread
+
+    Args:
+        registry (MetricsRegistry): Metrics to expose.
+        port (int): TCP port.
+        host (str, optional): Bind address. (default: `"127.0.0.1"`)
+
+    Returns:
+        http.server.ThreadingHTTPServer: Running server
+    """
+    handler = type("Handler", (MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+metrics = MetricsRegistry()
@@ -1,45 +1,125 @@
+import atexit
+import json
+import queue
+import random
+import threading
 import time
+from datetime import datetime
+from pathlib import Path
 
-from requests.exceptions import RequestException
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+from app.utils.metrics import metrics
+
+slack_posts = metrics.counter("slack_posts_total", "Slack messages posted")
+slack_failures = metrics.counter("slack_post_failures_total", "Failed Slack posts")
+slack_latency = metrics.histogram("slack_post_seconds", "Slack post latency")
+slack_spilled = metrics.counter(
+    "slack_spilled_total", "Slack messages spilled to disk or dropped"
+)
+
+
+def _slack_api_error():
+    """`slack_sdk.errors.SlackApiError`, imported on demand
+
+    slack_sdk is only needed once something is posted, so it stays off the
+    startup path. `except` clauses evaluate this only when an error is raised.
+    Network errors (urllib and requests alike) are `OSError` subclasses.
+    """
+    from slack_sdk.errors import SlackApiError
+
+    return SlackApiError
 
 
 class Slack:
-    def __init__(self, token: str):
-        self.client = WebClient(token)
-        self.channels = self.get_channels()
+    def __init__(self, token: str, channel_ttl_sec=3600.0, min_refresh_sec=30.0):
+        """Constructor of Slack
+
+        Nothing is sent to Slack until the first post: the client and the
+        channel name -> ID cache are built on first use.
+
+        Args:
+            token (str): Slack API token
+            channel_ttl_sec (float, optional): Lifetime of the channel cache. (default: `3600.0`)
+            min_refresh_sec (float, optional): Minimum interval between on-demand refreshes. (default: `30.0`)
+        """
+        self.token = token
+        self.channel_ttl_sec = channel_ttl_sec
+        self.min_refresh_sec = min_refresh_sec
         self.mx_retry = 3
-        self.retry = 0
+        self._client = None
+        self._channel_ids = {}
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def client(self):
+        if self._client is None:
+            from slack_sdk import WebClient
+
+            self._client = WebClient(self.token)
+        return self._client
 
     def get_channels(self, exclude_archived=True, **kwargs):
-        """Get channel list
+        """Get channel list (all pages)
 
         Returns:
             list: Channel list
         """
-        channels = self.client.conversations_list(
-            exclude_archived=exclude_archived, **kwargs
-        )
-        return channels["channels"]
+        channels = []
+        cursor = None
+        while True:
+            response = self.client.conversations_list(
+                exclude_archived=exclude_archived, cursor=cursor, **kwargs
+            )
+            channels.extend(response["channels"])
+            cursor = response.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                return channels
+
+    def refresh_channels(self):
+        """Rebuild the channel name -> ID cache"""
+        with self._lock:
+            channel_ids = {ch["name"]: ch["id"] for ch in self.get_channels()}
+            self._channel_ids = channel_ids
+            self._refreshed_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        if self._refreshing:
+            return
+        self._refreshing = True
+
+        def refresh():
+            try:
+                self.refresh_channels()
+            except (OSError, _slack_api_error()):
+                pass  # keep serving the stale cache
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=refresh, daemon=True).start()
 
-    def get_channel_id(self, channel):
+    def get_channel_id(self, channel, refresh=False):
         """Get channel ID
 
         Args:
             channel (str): Slack channel name
+            refresh (bool, optional): Refresh the cache before the lookup. (default: `False`)
 
         Returns:
             str: Channel ID
         """
-        channel_id = None
-        for ch in self.channels:
-            if ch["name"] == channel:
-                channel_id = ch["id"]
-                break
+        if self._refreshed_at is None:
+            self.refresh_channels()
+        elif refresh or channel not in self._channel_ids:
+            if time.monotonic() - self._refreshed_at >= self.min_refresh_sec:
+                self.refresh_channels()
+        elif time.monotonic() - self._refreshed_at >= self.channel_ttl_sec:
+            self._refresh_in_background()
+
+        channel_id = self._channel_ids.get(channel)
         if not channel_id:
             mock_response = {"ok": False, "error": "channel_not_found"}
-            raise SlackApiError("Channel not found", response=mock_response)
+            raise _slack_api_error()("Channel not found", response=mock_response)
         return channel_id
 
     def post_text(self, channel, text, **kwargs):
@@ -52,15 +132,15 @@ class Slack:
         Returns:
             dict: API response
         """
-        try:
-            return self._post_text(channel, text, **kwargs)
-        except (RequestException, SlackApiError) as e:
-            if self.retry >= self.mx_retry:
-                self.retry = 0
-                raise e
-            time.sleep(10)  # Wait 10 seconds
-            self.retry += 1
-            return self.post_text(channel, e, **kwargs)
+        retry = 0  # per call, so concurrent callers do not share the count
+        while True:
+            try:
+                return self._post_text(channel, text, **kwargs)
+            except (OSError, _slack_api_error()) as e:
+                if retry >= self.mx_retry:
+                    raise e
+                time.sleep(10)  # Wait 10 seconds
+                retry += 1
 
     def _post_text(self, channel, text, **kwargs):
         """Post a message to a channel
@@ -72,6 +152,16 @@ class Slack:
         Returns:
             dict: API response
         """
+        try:
+            with slack_latency.time():
+                response = self._post_message(channel, text, **kwargs)
+        except (OSError, _slack_api_error()):
+            slack_failures.inc()
+            raise
+        slack_posts.inc()
+        return response
+
+    def _post_message(self, channel, text, **kwargs):
         try:
             response = self.client.chat_postMessage(
                 channel=self.get_channel_id(channel),
@@ -79,8 +169,15 @@ class Slack:
                 **kwargs,
             )
             return response
-        except SlackApiError as e:
-            raise e
+        except _slack_api_error() as e:
+            if e.response.get("error") != "channel_not_found":
+                raise e
+            # the cached ID may be stale (channel renamed or recreated): refresh once
+            return self.client.chat_postMessage(
+                channel=self.get_channel_id(channel, refresh=True),
+                text=self._validate_text(text),
+                **kwargs,
+            )
 
     def post_file(self, channel, files, **kwargs):
         """Post a file to a channel
@@ -120,3 +217,185 @@ class Slack:
         if len(text) > 3000:
             return text[:3000]
         return text
+
+
+class SlackMessage:
+    def __init__(self, channel, text, **kwargs):
+        """Queued message with its own retry state
+
+        Args:
+            channel (str): Slack channel name
+            text (str): Message text
+        """
+        self.channel = channel
+        self.text = text
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.next_time = 0.0
+
+
+class SlackNotifier:
+    def __init__(
+        self,
+        slack,
+        max_queue=100,
+        batch_sec=1.0,
+        max_batch=20,
+        mx_retry=3,
+        backoff_sec=1.0,
+        max_backoff_sec=60.0,
+        spill_file=None,
+    ):
+        """Non-blocking Slack poster with a background worker
+
+        `post_text` only enqueues the message and returns. The worker coalesces
+        messages posted within `batch_sec` into one message per channel and
+        retries failed posts with jittered exponential backoff. When the queue
+        is full, or a message runs out of retries, it is appended to
+        `spill_file` (JSON lines) or dropped.
+
+        Args:
+            slack (Slack): Slack client used by the worker.
+            max_queue (int, optional): Queue capacity in messages. (default: `100`)
+            batch_sec (float, optional): Coalescing window in seconds. (default: `1.0`)
+            max_batch (int, optional): Maximum messages per batch. (default: `20`)
+            mx_retry (int, optional): Retries per message. (default: `3`)
+            backoff_sec (float, optional): First retry delay in seconds. (default: `1.0`)
+            max_backoff_sec (float, optional): Maximum retry delay in seconds. (default: `60.0`)
+            spill_file (str | pathlib.Path, optional): Where to keep undelivered messages.
+        """
+        self.slack = slack
+        self.batch_sec = batch_sec
+        self.max_batch = max_batch
+        self.mx_retry = mx_retry
+        self.backoff_sec = backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.spill_file = Path(spill_file) if spill_file else None
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        self._retries = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="slack", daemon=True)
+        self._worker.start()
+        atexit.register(self.flush)
+        metrics.gauge(
+            "slack_queue_pending",
+            "Slack messages waiting for delivery",
+            lambda: self._pending,
+        )
+
+    def __getattr__(self, name):
+        # get_channel_id, post_file, ... stay synchronous
+        return getattr(self.slack, name)
+
+    def post_text(self, channel, text, **kwargs):
+        """Queue a message and return immediately
+
+        Args:
+            channel (str): Slack channel name
+            text (str): Message text
+        """
+        message = SlackMessage(channel, text, **kwargs)
+        try:
+            with self._lock:
+                self._pending += 1
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._spill(message, "queue full")
+            self._done()
+
+    def flush(self, timeout=5.0):
+        """Wait until the queued messages are delivered, spilled or dropped
+
+        Args:
+            timeout (float, optional): Maximum wait in seconds. (default: `5.0`)
+
+        Returns:
+            bool: True if the queue was drained in time.
+        """
+        deadline = time.monotonic() + timeout
+        while self._pending:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            for group in self._group(batch):
+                self._send(group)
+
+    def _next_batch(self):
+        """Block for the first message, then collect the ones arriving within `batch_sec`"""
+        timeout = None
+        if self._retries:
+            timeout = max(min(m.next_time for m in self._retries) - time.monotonic(), 0)
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+            deadline = time.monotonic() + self.batch_sec
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch.append(self._queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        due = [m for m in self._retries if m.next_time <= now]
+        self._retries = [m for m in self._retries if m.next_time > now]
+        return due + batch
+
+    def _group(self, batch):
+        groups = {}
+        for message in batch:
+            # messages with extra arguments (blocks, threads, ...) are sent on their own
+            key = (message.channel,) if not message.kwargs else (id(message),)
+            groups.setdefault(key, []).append(message)
+        return groups.values()
+
+    def _send(self, group):
+        text = "\n".join(str(m.text) for m in group if m.text)
+        try:
+            self.slack._post_text(group[0].channel, text, **group[0].kwargs)
+        except (OSError, _slack_api_error()) as e:
+            for message in group:
+                self._retry(message, e)
+            return
+        for _ in group:
+            self._done()
+
+    def _retry(self, message, error):
+        message.attempts += 1
+        if message.attempts > self.mx_retry:
+            self._spill(message, str(error))
+            self._done()
+            return
+        delay = min(
+            self.backoff_sec * 2 ** (message.attempts - 1), self.max_backoff_sec
+        )
+        message.next_time = time.monotonic() + random.uniform(0, delay)
+        self._retries.append(message)
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _spill(self, message, reason):
+        slack_spilled.inc()
+        if self.spill_file is None:
+            self.dropped += 1
+            return
+        record = {
+            "time": datetime.now().isoformat(),
+            "channel": message.channel,
+            "text": str(message.text),
+            "reason": reason,
+        }
+        with self._lock:
+            self.spill_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,108 @@
+import builtins
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    def __init__(self):
+        """Timing of the imports and initialisation steps up to the first analysed frame
+
+        Steps are always recorded (a `perf_counter` call each); import timing
+        is only collected once `enable` hooks `__import__`.
+        """
+        self.enabled = False
+        self.start = time.perf_counter()
+        self.imports = []  # (module, seconds, depth)
+        self.steps = []  # (name, seconds, seconds since start)
+        self._local = threading.local()
+        self._original_import = None
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def disable(self):
+        if not self.enabled:
+            return
+        builtins.__import__ = self._original_import
+        self.enabled = False
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        t = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self.imports.append((name, time.perf_counter() - t, depth))
+            self._local.depth = depth
+
+    @contextmanager
+    def step(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.steps.append((name, now - t, now - self.start))
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.steps.append((name, 0.0, now - self.start))
+
+    def report(self, top=15):
+        """Format the collected timings
+
+        Args:
+            top (int, optional): Number of slowest imports to list. (default: `15`)
+
+        Returns:
+            str: Report
+        """
+        lines = ["Startup profile:"]
+        for name, seconds, at in self.steps:
+            lines.append(f"  {at * 1000:8.1f} ms  {name} ({seconds * 1000:.1f} ms)")
+        if self.imports:
+            lines.append(f"Slowest imports (inclusive, top {top}):")
+            for name, seconds, depth in sorted(self.imports, key=lambda i: -i[1])[:top]:
+                lines.append(f"  {seconds * 1000:8.1f} ms  {'  ' * depth}{name}")
+        return "\n".join(lines)
+
+
+def preload(*modules):
+    """Import modules in a daemon thread, off the path to the first frame
+
+    Args:
+        *modules (str): Module names.
+
+    Returns:
+        threading.Thread: Loader thread
+    """
+
+    def load():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+    thread = threading.Thread(target=load, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+profiler = StartupProfiler()
+# STARTUP_PROFILE=1 reports the time per import and per step up to the first analysed
+# frame. Enabled here, the first module imported by app.utils, to see every import.
+if os.getenv("STARTUP_PROFILE") == "1":
+    profiler.enable()
@@ -0,0 +1,134 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import QueueListener, RotatingFileHandler
+from pathlib import Path
+
+
+class Trace:
+    def __init__(self, tracer, kind):
+        """Timeline of one detected event
+
+        Spans are measured on the monotonic clock and stored as offsets from
+        the start of the trace, so they can be compared across events.
+
+        Args:
+            tracer (Tracer): Journal the trace is written to.
+            kind (str): Event kind, e.g. `call` or `unlock`.
+        """
+        self.tracer = tracer
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.time = time.time()
+        self.start = time.monotonic()
+        self.spans = {}
+        self.attrs = {}
+
+    def add(self, name, start, end=None):
+        """Record a span from monotonic timestamps
+
+        Args:
+            name (str): Stage name.
+            start (float): `time.monotonic()` at the start of the stage.
+            end (float, optional): `time.monotonic()` at the end. (default: now)
+        """
+        end = time.monotonic() if end is None else end
+        self.start = min(self.start, start)
+        self.spans[name] = (start, end - start)
+
+    @contextmanager
+    def span(self, name):
+        start = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.add(name, start)
+
+    def finish(self, **attrs):
+        """Close the trace and append it to the journal
+
+        Args:
+            **attrs: Outcome fields stored with the trace.
+        """
+        self.attrs.update(attrs)
+        self.tracer.write(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "time": round(self.time, 3),
+            "total": round(time.monotonic() - self.start, 6),
+            # name: [offset from the first span, duration] in seconds
+            "spans": {
+                name: [round(start - self.start, 6), round(duration, 6)]
+                for name, (start, duration) in self.spans.items()
+            },
+            **self.attrs,
+        }
+
+
+class Tracer:
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=1):
+        """Writer of completed traces as JSON lines
+
+        Traces are queued and written by a `QueueListener` thread to a
+        rotating file, so finishing a trace never waits on the disk.
+
+        Args:
+            path (str): Journal file. Empty disables the journal.
+            max_bytes (int, optional): Size at which the journal is rotated. \
+                (default: `10 MiB`)
+            backup_count (int, optional): Rotated journals kept. (default: `1`)
+        """
+        self.path = Path(path) if path else None
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def start(self, kind):
+        return Trace(self, kind)
+
+    def write(self, trace):
+        if self.path is None:
+            return
+        if self._queue is None:
+            self._start_listener()
+        line = json.dumps(trace.to_dict(), separators=(",", ":"))
+        self._queue.put(logging.makeLogRecord({"msg": line}))
+
+    def _start_listener(self):
+        """Open the journal and start the writer thread, on the first trace"""
+        with self._lock:
+            if self._queue is not None:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(
+                self.path,
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            trace_queue = queue.SimpleQueue()
+            self._listener = QueueListener(trace_queue, handler)
+            self._listener.start()
+            self._queue = trace_queue
+            atexit.register(self.close)
+
+    def close(self):
+        """Write the queued traces and stop the writer thread"""
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+                self._listener = None
+                self._queue = None
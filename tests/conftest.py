@@ -0,0 +1,9 @@
+import os
+from pathlib import Path
+
+import dotenv
+
+# app.utils reads its settings from the environment on import: use the example ones
+EXAMPLE_ENV = Path(__file__).resolve().parents[1] / ".env.example"
+for key, value in dotenv.dotenv_values(EXAMPLE_ENV).items():
+    os.environ.setdefault(key, value or "")
@@ -0,0 +1,81 @@
+import pytest
+
+from app.src.audio.bus import AudioBus
+
+
+@pytest.fixture
+def bus():
+    bus = AudioBus(chunk=4, channels=2, capacity=5)
+    yield bus
+    bus.close()
+
+
+def publish(bus, n):
+    for _ in range(n):
+        bus.next_slot()[:] = bus.written
+        bus.commit()
+
+
+def test_capacity_is_at_least_three():
+    bus = AudioBus(chunk=4, channels=1, capacity=1)
+    try:
+        assert bus.capacity == 3
+    finally:
+        bus.close()
+
+
+def test_cursor_reads_in_order_and_tracks_lag(bus):
+    cursor = bus.cursor("detector")
+    assert cursor.read_nowait() is None
+
+    publish(bus, 3)
+    assert cursor.lag == 3
+    assert bus.lags() == {"detector": 3}
+    assert [int(cursor.read_nowait()[0]) for _ in range(3)] == [0, 1, 2]
+    assert cursor.lag == 0
+    assert cursor.read_nowait() is None
+    assert cursor.missed == 0
+
+
+def test_views_are_read_only(bus):
+    cursor = bus.cursor("detector")
+    publish(bus, 1)
+    with pytest.raises(ValueError):
+        cursor.read_nowait()[0] = 1
+
+
+def test_lagging_cursor_resumes_at_oldest_and_counts_missed(bus):
+    cursor = bus.cursor("recorder", position=0)
+    publish(bus, 12)
+
+    assert bus.oldest() == 12 - bus.capacity + 2
+    assert int(cursor.read_nowait()[0]) == bus.oldest()
+    assert cursor.missed == bus.oldest()
+    assert bus.missed == cursor.missed
+    assert cursor.lag == bus.capacity - 3
+
+
+def test_new_cursor_starts_no_earlier_than_oldest(bus):
+    publish(bus, 12)
+    cursor = bus.cursor("late", position=0)
+    assert cursor.position == bus.oldest()
+    assert cursor.missed == 0
+
+
+def test_report_logs_missed_chunks_once(bus):
+    cursor = bus.cursor("recorder", position=0)
+    publish(bus, 12)
+    cursor.read_nowait()
+
+    bus.report()
+    assert cursor.reported_missed == cursor.missed
+
+
+def test_read_times_out_and_returns_none_once_closed(bus):
+    cursor = bus.cursor("detector")
+    assert cursor.read(timeout=0.01) is None
+    publish(bus, 1)
+    cursor.close()
+    assert int(cursor.read()[0]) == 0
+    assert cursor.read() is None
+    assert "detector" not in bus.lags()
@@ -0,0 +1,50 @@
+import pytest
+
+from app.utils.config import DetectionConfig
+
+ENV = {
+    "AUDIO_THRESHOLD": "0.99",
+    "CONSECUTIVE_SEC_THRESHOLD": "0.5",
+    "INTERVAL_SEC_THRESHOLD": "30",
+    "RECORDING_DURATION_SEC": "3",
+}
+
+
+def test_from_env():
+    config = DetectionConfig.from_env(ENV)
+    assert config.threshold == 0.99
+    assert config.consecutive_sec == 0.5
+    assert config.interval_sec == 30
+    assert config.duration == 3
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        (1.5, 0.5, 30, 3),
+        (-0.1, 0.5, 30, 3),
+        (0.99, -1, 30, 3),
+        (0.99, 0.5, -1, 3),
+        (0.99, 0.5, 30, 0),
+    ],
+)
+def test_out_of_range_values_are_rejected(args):
+    with pytest.raises(ValueError):
+        DetectionConfig(*args)
+
+
+def test_bounds_are_accepted():
+    DetectionConfig(0, 0, 0, 1)
+    DetectionConfig(1, 0, 0, 1)
+
+
+def test_from_env_rejects_a_missing_variable():
+    env = dict(ENV)
+    del env["RECORDING_DURATION_SEC"]
+    with pytest.raises(KeyError):
+        DetectionConfig.from_env(env)
+
+
+def test_from_env_rejects_a_value_that_is_not_a_number():
+    with pytest.raises(ValueError):
+        DetectionConfig.from_env({**ENV, "INTERVAL_SEC_THRESHOLD": "30s"})
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from app.src.audio.encoder import (
+    AudioEncoder,
+    PolyphaseResampler,
+    lowpass_filter,
+    ulaw_decode,
+    ulaw_encode,
+)
+
+RNG = np.random.default_rng(0)
+
+
+def reference_resample(samples, resampler):
+    """Upsample by zero stuffing, filter, then decimate: every sample computed"""
+    h = lowpass_filter(resampler.up, resampler.taps, resampler.down)
+    upsampled = np.zeros(samples.size * resampler.up)
+    upsampled[:: resampler.up] = samples
+    filtered = np.convolve(upsampled, h)
+    n = resampler.output_size(samples.size)
+    return filtered[np.arange(n) * resampler.down]
+
+
+@pytest.mark.parametrize("rate_in, rate_out", [(11025, 8000), (44100, 16000)])
+def test_resampler_matches_the_direct_filter(rate_in, rate_out):
+    samples = RNG.standard_normal(3000)
+    resampler = PolyphaseResampler(rate_in, rate_out)
+
+    out = resampler(samples)
+
+    assert out.size == resampler.output_size(samples.size)
+    np.testing.assert_allclose(out, reference_resample(samples, resampler), atol=1e-9)
+
+
+def test_resampler_has_no_seams_between_chunks():
+    samples = RNG.standard_normal(5000)
+    whole = PolyphaseResampler(11025, 8000)(samples)
+
+    resampler = PolyphaseResampler(11025, 8000)
+    chunks = np.split(samples, [1024, 1100, 2048, 4999])
+    chunked = np.concatenate([resampler(chunk) for chunk in chunks])
+
+    np.testing.assert_allclose(chunked, whole, atol=1e-9)
+
+
+def test_ulaw_encode_matches_audioop():
+    audioop = pytest.importorskip("audioop")  # removed in Python 3.13
+    samples = np.arange(-32768, 32768, dtype=np.int16)
+    expected = np.frombuffer(audioop.lin2ulaw(samples.tobytes(), 2), dtype=np.uint8)
+    np.testing.assert_array_equal(ulaw_encode(samples), expected)
+
+
+def test_ulaw_decode_matches_audioop():
+    audioop = pytest.importorskip("audioop")
+    codes = np.arange(256, dtype=np.uint8)
+    expected = np.frombuffer(audioop.ulaw2lin(codes.tobytes(), 2), dtype=np.int16)
+    np.testing.assert_array_equal(ulaw_decode(codes), expected)
+
+
+def test_encoder_identity_passes_chunks_through():
+    encoder = AudioEncoder(11025, 2)
+    frame = RNG.integers(-1000, 1000, 2048, dtype=np.int16).tobytes()
+    assert encoder.is_identity
+    assert encoder(frame) is frame
+
+
+@pytest.mark.parametrize("codec", ["pcm", "ulaw"])
+def test_encoder_data_size_matches_the_output(codec):
+    encoder = AudioEncoder(11025, 2, rate_out=8000, mono=True, codec=codec)
+    frames = [
+        RNG.integers(-1000, 1000, 1024 * 2, dtype=np.int16).tobytes() for _ in range(7)
+    ]
+
+    data = b"".join(encoder(frame) for frame in frames)
+
+    assert len(data) == encoder.data_size(1024 * 7)
+    assert encoder.description == f"{codec}/8000/1"
+
+
+def test_encoder_silence_decodes_to_zero():
+    assert not ulaw_decode(
+        np.frombuffer(AudioEncoder(8000, 1, codec="ulaw").silence(4), dtype=np.uint8)
+    ).any()
+    assert AudioEncoder(8000, 1).silence(4) == bytes(4)
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        AudioEncoder(8000, 1, codec="mp3")
@@ -0,0 +1,65 @@
+import numpy as np
+
+from app.src.audio.endpoint import Endpointer
+
+CHUNK = 100
+RATE = 1000  # 10 chunks per second
+
+
+def silence(i):
+    return np.full(CHUNK, i, dtype=np.int16).tobytes()  # far below min_level, unique
+
+
+def speech(i):
+    t = np.arange(CHUNK) / RATE
+    return (np.sin(2 * np.pi * 50 * t) * (8000 + i)).astype(np.int16).tobytes()
+
+
+def clip(pattern):
+    """Chunks of a clip from a pattern such as `..ss...`, s: speech, .: silence"""
+    return [speech(i) if c == "s" else silence(i) for i, c in enumerate(pattern)]
+
+
+def endpointer(**kwargs):
+    kwargs = {"silence_sec": 0.3, "min_sec": 0, "pad_sec": 0.1, **kwargs}
+    return Endpointer(CHUNK, 1, RATE, **kwargs)
+
+
+def test_classifies_chunks():
+    ep = endpointer()
+    assert ep.is_speech(speech(0))
+    assert not ep.is_speech(silence(5))
+
+
+def test_trims_leading_and_trailing_silence():
+    frames = clip(".....ssss..........")
+    ep = endpointer()
+
+    kept = list(ep.trim(frames))
+
+    assert kept == frames[4:10]  # one chunk of padding on each side
+    assert ep.trimmed == 4 + 2  # the clip ends after three silent chunks
+
+
+def test_keeps_short_pauses():
+    frames = clip("ss..ss....")
+    kept = list(endpointer().trim(frames))
+    assert kept == frames[:7]
+
+
+def test_does_not_end_before_hold_and_min_chunks():
+    frames = clip("ss" + "." * 10)
+    ep = endpointer(min_sec=0.5)
+
+    kept = list(ep.trim(frames, hold=3))
+
+    # the clip ends at chunk 3 + 5, with seven silent chunks, not after three
+    assert kept == frames[:3]
+    assert ep.trimmed == 6
+
+
+def test_passes_a_clip_without_speech_through():
+    frames = clip("......")
+    ep = endpointer()
+    assert list(ep.trim(frames)) == frames
+    assert ep.trimmed == 0
@@ -0,0 +1,26 @@
+import pytest
+
+from app.src.manager import Backoff
+
+
+def test_backoff_doubles_up_to_the_maximum():
+    backoff = Backoff(0.1, 1.0)
+    for expected in (0.1, 0.2, 0.4, 0.8, 1.0, 1.0):
+        delay = backoff.next()
+        assert expected / 2 <= delay <= expected
+
+
+def test_backoff_jitter_takes_off_up_to_half(monkeypatch):
+    backoff = Backoff(0.1, 1.0)
+    monkeypatch.setattr("random.uniform", lambda low, high: low)
+    assert backoff.next() == pytest.approx(0.05)
+    monkeypatch.setattr("random.uniform", lambda low, high: high)
+    assert backoff.next() == pytest.approx(0.2)
+
+
+def test_backoff_reset_starts_over_at_the_minimum():
+    backoff = Backoff(0.1, 30.0)
+    for _ in range(10):
+        backoff.next()
+    backoff.reset()
+    assert 0.05 <= backoff.next() <= 0.1
@@ -0,0 +1,53 @@
+from app.utils.metrics import MetricsRegistry, format_labels
+
+
+def test_format_labels():
+    assert format_labels(None) == ""
+    assert format_labels({"device": 1, "channel": "a"}) == '{channel="a",device="1"}'
+
+
+def test_render_counter_and_gauge():
+    registry = MetricsRegistry()
+    registry.counter("events_total", "Events").inc(3)
+    registry.gauge("level", "Level").set(0.5)
+
+    assert registry.render() == (
+        "# HELP events_total Events\n"
+        "# TYPE events_total counter\n"
+        "events_total 3\n"
+        "# HELP level Level\n"
+        "# TYPE level gauge\n"
+        "level 0.5\n"
+    )
+
+
+def test_render_gauge_callbacks_by_label():
+    registry = MetricsRegistry()
+    registry.gauge("lag", "Lag", fn=lambda: 1, labels={"device": "0"})
+    registry.gauge("lag", fn=lambda: 2, labels={"device": "1"})
+    registry.gauge("lag", fn=lambda: 3, labels={"device": "0"})  # rebound
+
+    lines = registry.render().splitlines()
+    assert lines[2:] == ['lag{device="0"} 3', 'lag{device="1"} 2']
+
+
+def test_render_histogram_is_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE latency_seconds histogram"
+    assert lines[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_registry_returns_the_same_metric():
+    registry = MetricsRegistry()
+    assert registry.counter("c") is registry.counter("c")